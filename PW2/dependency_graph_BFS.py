@@ -1,5 +1,7 @@
 from collections import deque, defaultdict
-from typing import Set, Dict, List, Optional
+from typing import Set, Dict, List, Union
+
+from package_filter import PackageFilter
 
 class DependencyGraph:
     def __init__(self):
@@ -12,16 +14,22 @@ class DependencyGraph:
         if dependency:  # Игнорируем пустые зависимости
             self.graph[package].add(dependency)
     
-    def build_graph_bfs(self, start_package: str, get_dependencies_func, exclude_filter: Optional[str] = None, max_depth: int = 10):
+    def build_graph_bfs(self, start_package: str, get_dependencies_func,
+                        exclude_filter: Union[str, PackageFilter, None] = None, max_depth: int = 10):
         """
         Строит граф зависимостей с помощью BFS
         
         Args:
             start_package: начальный пакет
             get_dependencies_func: функция для получения зависимостей пакета
-            exclude_filter: подстрока для исключения пакетов
+            exclude_filter: подстрока для исключения пакетов или скомпилированный PackageFilter
             max_depth: максимальная глубина поиска
         """
+        if isinstance(exclude_filter, str):
+            exclude_filter = PackageFilter(exclude=[f"sub:{exclude_filter}"]) if exclude_filter else None
+        package_filter = exclude_filter or None
+        skipped = set()
+
         queue = deque([(start_package, 0)])  # (package, depth)
         self.visited = set([start_package])
         self.cycles = []
@@ -37,9 +45,12 @@ class DependencyGraph:
                 dependencies = get_dependencies_func(current_package)
                 
                 for dep in dependencies:
-                    # Применяем фильтр исключения
-                    if exclude_filter and exclude_filter in dep:
-                        print(f"Пропуск пакета {dep} (фильтр: {exclude_filter})")
+                    # Фильтр проверяется до постановки в очередь, поэтому
+                    # исключённые пакеты никогда не скачиваются
+                    if package_filter is not None and not package_filter.allows(dep):
+                        if dep not in skipped:
+                            skipped.add(dep)
+                            print(f"Пропуск пакета {dep} (фильтр: {package_filter.describe()})")
                         continue
                     
                     self.add_dependency(current_package, dep)
@@ -0,0 +1,258 @@
+import csv
+from array import array
+from collections import deque
+from typing import Dict, List
+
+try:
+    import numpy as np
+except ImportError:  # без NumPy работаем на модуле array
+    np = None
+
+from dependency_graph_BFS import DependencyGraph
+
+
+class GraphAnalyzer:
+    """Аналитика графа зависимостей на массивной (CSR) матрице смежности"""
+
+    def __init__(self, graph: DependencyGraph, root: str):
+        self.root = root
+        names = set(graph.graph.keys())
+        for deps in graph.graph.values():
+            names.update(deps)
+        names.add(root)
+        self.names: List[str] = sorted(names)
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+
+        # CSR: зависимости пакета i лежат в indices[indptr[i]:indptr[i + 1]]
+        indptr = array('l', [0])
+        indices = array('l')
+        for name in self.names:
+            indices.extend(sorted(self.index[dep] for dep in graph.graph.get(name, ())))
+            indptr.append(len(indices))
+        self.indptr = indptr
+        self.indices = indices
+
+    @property
+    def size(self) -> int:
+        return len(self.names)
+
+    def _edge_sources(self):
+        """Возвращает массив источников рёбер (параллельный indices)"""
+        if np is not None:
+            indptr = np.frombuffer(self.indptr, dtype='l')
+            return np.repeat(np.arange(self.size), np.diff(indptr))
+        sources = array('l')
+        for i in range(self.size):
+            sources.extend([i] * (self.indptr[i + 1] - self.indptr[i]))
+        return sources
+
+    def out_degree(self):
+        """Количество прямых зависимостей каждого пакета"""
+        if np is not None:
+            return np.diff(np.frombuffer(self.indptr, dtype='l'))
+        return array('l', (self.indptr[i + 1] - self.indptr[i] for i in range(self.size)))
+
+    def in_degree(self):
+        """Количество пакетов, напрямую зависящих от данного"""
+        if np is not None:
+            return np.bincount(np.frombuffer(self.indices, dtype='l'), minlength=self.size)
+        degree = array('l', [0] * self.size)
+        for dep in self.indices:
+            degree[dep] += 1
+        return degree
+
+    def depths(self):
+        """Глубина каждого пакета от корня (BFS по фронту), -1 если недостижим"""
+        start = self.index[self.root]
+        if np is not None:
+            indptr = np.frombuffer(self.indptr, dtype='l')
+            indices = np.frombuffer(self.indices, dtype='l')
+            depth = np.full(self.size, -1, dtype=np.int_)
+            depth[start] = 0
+            frontier = np.array([start])
+            level = 0
+            while frontier.size:
+                starts = indptr[frontier]
+                lengths = indptr[frontier + 1] - starts
+                total = int(lengths.sum())
+                if total == 0:
+                    break
+                # собираем всех соседей фронта одним срезом без цикла по вершинам
+                offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+                neighbours = np.unique(indices[offsets])
+                frontier = neighbours[depth[neighbours] < 0]
+                level += 1
+                depth[frontier] = level
+            return depth
+
+        depth = array('l', [-1] * self.size)
+        depth[start] = 0
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            for k in range(self.indptr[current], self.indptr[current + 1]):
+                dep = self.indices[k]
+                if depth[dep] < 0:
+                    depth[dep] = depth[current] + 1
+                    queue.append(dep)
+        return depth
+
+    def _components(self):
+        """
+        Компоненты сильной связности (итеративный Тарьян). Компонента получает
+        номер раньше всех, от кого она зависит, поэтому обход по убыванию
+        номеров идёт в топологическом порядке сжатого графа.
+        """
+        n = self.size
+        indptr, indices = self.indptr, self.indices
+        order = array('l', [-1] * n)
+        low = array('l', [0] * n)
+        comp = array('l', [-1] * n)
+        stack = []
+        count = 0
+        visited = 0
+        for root in range(n):
+            if order[root] >= 0:
+                continue
+            order[root] = low[root] = visited
+            visited += 1
+            stack.append(root)
+            work = [[root, indptr[root]]]
+            while work:
+                frame = work[-1]
+                v, k = frame
+                if k < indptr[v + 1]:
+                    frame[1] = k + 1
+                    dep = indices[k]
+                    if order[dep] < 0:
+                        order[dep] = low[dep] = visited
+                        visited += 1
+                        stack.append(dep)
+                        work.append([dep, indptr[dep]])
+                    elif comp[dep] < 0 and order[dep] < low[v]:  # dep ещё в стеке
+                        low[v] = order[dep]
+                    continue
+                work.pop()
+                if work and low[v] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[v]
+                if low[v] == order[v]:
+                    while True:
+                        member = stack.pop()
+                        comp[member] = count
+                        if member == v:
+                            break
+                    count += 1
+        return comp, count
+
+    def reverse_closure_sizes(self):
+        """
+        Размер обратного замыкания: сколько пакетов транзитивно зависят от данного.
+        Циклы сжимаются в компоненты, а множества предков (битовые строки)
+        проталкиваются по сжатому графу за один топологический проход; строка
+        компоненты освобождается, как только она передана всем зависимостям.
+        """
+        n = self.size
+        comp, count = self._components()
+        members: List[List[int]] = [[] for _ in range(count)]
+        for i in range(n):
+            members[comp[i]].append(i)
+
+        bits = [0] * count
+        sizes = array('l', [0] * count)
+        for c in range(count - 1, -1, -1):
+            mask = bits[c]
+            bits[c] = None
+            for i in members[c]:
+                mask |= 1 << i
+            sizes[c] = mask.bit_count() - 1
+            for i in members[c]:
+                for k in range(self.indptr[i], self.indptr[i + 1]):
+                    dep = comp[self.indices[k]]
+                    if dep != c:
+                        bits[dep] |= mask
+
+        closure = array('l', (sizes[comp[i]] for i in range(n)))
+        if np is not None:
+            return np.frombuffer(closure, dtype='l').astype(np.int_)
+        return closure
+
+    def criticality(self, damping: float = 0.85, iterations: int = 100, tol: float = 1e-10):
+        """
+        Оценка критичности в стиле PageRank: вес пакета перетекает к его
+        зависимостям, поэтому выше всех оказываются общие для многих пакетов узлы.
+        """
+        n = self.size
+        if n == 0:
+            return array('d')
+        out_degree = self.out_degree()
+        if np is not None:
+            sources = self._edge_sources()
+            targets = np.frombuffer(self.indices, dtype='l')
+            dangling = out_degree == 0
+            safe_degree = np.where(dangling, 1, out_degree)
+            rank = np.full(n, 1.0 / n)
+            for _ in range(iterations):
+                share = rank / safe_degree
+                spread = np.bincount(targets, weights=share[sources], minlength=n)
+                new_rank = (1.0 - damping) / n + damping * (spread + rank[dangling].sum() / n)
+                delta = np.abs(new_rank - rank).sum()
+                rank = new_rank
+                if delta < tol:
+                    break
+            return rank
+
+        rank = array('d', [1.0 / n] * n)
+        for _ in range(iterations):
+            dangling_sum = sum(rank[i] for i in range(n) if out_degree[i] == 0)
+            base = (1.0 - damping) / n + damping * dangling_sum / n
+            new_rank = array('d', [base] * n)
+            for src in range(n):
+                if out_degree[src]:
+                    share = damping * rank[src] / out_degree[src]
+                    for k in range(self.indptr[src], self.indptr[src + 1]):
+                        new_rank[self.indices[k]] += share
+            delta = sum(abs(new_rank[i] - rank[i]) for i in range(n))
+            rank = new_rank
+            if delta < tol:
+                break
+        return rank
+
+    def report(self) -> List[dict]:
+        """Сводная таблица метрик, отсортированная по риску"""
+        in_degree = self.in_degree()
+        out_degree = self.out_degree()
+        depth = self.depths()
+        closure = self.reverse_closure_sizes()
+        score = self.criticality()
+        rows = []
+        for i, name in enumerate(self.names):
+            rows.append({
+                "package": name,
+                "in_degree": int(in_degree[i]),
+                "out_degree": int(out_degree[i]),
+                "depth": int(depth[i]),
+                "reverse_closure": int(closure[i]),
+                "criticality": float(score[i]),
+            })
+        rows.sort(key=lambda row: (-row["reverse_closure"], -row["criticality"], row["package"]))
+        return rows
+
+    def display_top(self, rows: List[dict], top: int = 10):
+        """Печатает top-N самых рискованных пакетов"""
+        backend = "numpy" if np is not None else "array"
+        print(f"\nАнализ графа ({len(rows)} пакетов, backend: {backend}), топ-{top}:")
+        print(f"{'Пакет':<30} {'вх.':>5} {'исх.':>5} {'глуб.':>6} {'обр.замык.':>11} {'критичн.':>10}")
+        print("-" * 72)
+        for row in rows[:top]:
+            depth = row["depth"] if row["depth"] >= 0 else "-"
+            print(f"{row['package']:<30} {row['in_degree']:>5} {row['out_degree']:>5} "
+                  f"{depth:>6} {row['reverse_closure']:>11} {row['criticality']:>10.4f}")
+
+    @staticmethod
+    def write_csv(rows: List[dict], path: str):
+        """Сохраняет полный отчёт в CSV"""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ["package"])
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Отчёт анализа сохранен в: {path}")
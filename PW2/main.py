@@ -6,6 +6,8 @@ from errors_not_for_us import *
 from apk_analizer import APKAnalyzer
 from dependency_graph_BFS import DependencyGraph
 from test import TestRepository
+from graph_analytics import GraphAnalyzer
+from package_filter import PackageFilter
 
 def main():
     parser = argparse.ArgumentParser(
@@ -26,10 +28,18 @@ def main():
                        help="Версия пакета (требуется для режимов local и remote)")
     parser.add_argument("--output", type=validate_output,
                        help="Имя выходного файла для графа")
-    parser.add_argument("--exclude",
-                       help="Подстрока для исключения пакетов из анализа")
+    parser.add_argument("--exclude", action="append", default=[],
+                       help="Шаблон для исключения пакетов из анализа (подстрока, маска, re:..., so:...); можно повторять")
+    parser.add_argument("--include", action="append", default=[],
+                       help="Шаблон пакетов, которые нужно оставить в анализе; можно повторять")
     parser.add_argument("--max-depth", type=int, default=10,
                        help="Максимальная глубина поиска зависимостей")
+    parser.add_argument("--analyze", action="store_true",
+                       help="Отчёт о самых рискованных пакетах (степени, глубина, обратное замыкание, критичность)")
+    parser.add_argument("--top", type=int, default=10,
+                       help="Количество строк в таблице отчёта --analyze")
+    parser.add_argument("--analyze-csv",
+                       help="Сохранить полный отчёт --analyze в CSV-файл")
     
     if len(sys.argv) == 1:
         parser.print_help()
@@ -43,8 +53,9 @@ def main():
         print(f"Режим: {args.mode}")
         if args.version:
             print(f"Версия: {args.version}")
-        if args.exclude:
-            print(f"Исключение: {args.exclude}")
+        package_filter = PackageFilter(include=args.include, exclude=args.exclude)
+        if package_filter:
+            print(f"Фильтр: {package_filter.describe()}")
         if args.max_depth:
             print(f"Максимальная глубина: {args.max_depth}")
         print("=" * 60)
@@ -67,7 +78,7 @@ def main():
             graph.build_graph_bfs(
                 start_package=args.package_name,
                 get_dependencies_func=test_repo.get_dependencies,
-                exclude_filter=args.exclude,
+                exclude_filter=package_filter,
                 max_depth=args.max_depth
             )
             
@@ -87,7 +98,7 @@ def main():
             graph.build_graph_bfs(
                 start_package=args.package_name,
                 get_dependencies_func=get_apk_dependencies,
-                exclude_filter=args.exclude,
+                exclude_filter=package_filter,
                 max_depth=args.max_depth
             )
             
@@ -97,6 +108,13 @@ def main():
         print(f"   Всего пакетов в графе: {len(graph.visited)}")
         print(f"   Обнаружено циклов: {len(graph.cycles)}")
         
+        if args.analyze or args.analyze_csv:
+            analyzer = GraphAnalyzer(graph, args.package_name)
+            rows = analyzer.report()
+            analyzer.display_top(rows, args.top)
+            if args.analyze_csv:
+                analyzer.write_csv(rows, args.analyze_csv)
+        
         if args.output:
             # Здесь можно добавить экспорт в DOT формат для визуализации
             print(f"Граф сохранен в: {args.output}")
@@ -117,4 +135,7 @@ if __name__ == "__main__":
 #   python main.py --package-name busybox --repo-url https://dl-cdn.alpinelinux.org/alpine/v3.21/main/x86_64/ --mode remote --version 1.37.0-r13
   
 #   # С исключением пакетов
-#   python main.py --package-name A --repo-url test.txt --mode test --exclude C    
\ No newline at end of file
+#   python main.py --package-name A --repo-url test.txt --mode test --exclude C
+
+#   # Отчёт о критичных пакетах (топ-5 и CSV)
+#   python main.py --package-name A --repo-url test.txt --mode test --analyze --top 5 --analyze-csv report.csv    
\ No newline at end of file
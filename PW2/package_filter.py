@@ -0,0 +1,83 @@
+import fnmatch
+import re
+from typing import Dict, Iterable, Optional, Pattern
+
+GLOB_CHARS = "*?["
+
+
+class PackageFilter:
+    """
+    Скомпилированный набор шаблонов include/exclude для имён пакетов.
+
+    Форматы шаблонов:
+        re:<выражение>   - регулярное выражение (поиск в любом месте имени)
+        glob:<маска>     - маска целиком по имени (fnmatch)
+        sub:<строка>     - подстрока
+        so: / cmd: / pc: - префикс пространства имён (шаблон оканчивается на ':')
+        без префикса     - маска, если есть символы *?[, иначе подстрока
+
+    Все шаблоны одной группы сливаются в одно регулярное выражение, а решение
+    для каждого имени кешируется, поэтому повторная проверка ребра стоит один
+    поиск в словаре независимо от количества шаблонов.
+    """
+
+    def __init__(self, include: Optional[Iterable[str]] = None,
+                 exclude: Optional[Iterable[str]] = None, ignore_case: bool = False):
+        self.include = [p for p in (include or []) if p]
+        self.exclude = [p for p in (exclude or []) if p]
+        flags = re.IGNORECASE if ignore_case else 0
+        self._include = self._compile(self.include, flags)
+        self._exclude = self._compile(self.exclude, flags)
+        self._cache: Dict[str, bool] = {}
+
+    @staticmethod
+    def _compile(patterns: Iterable[str], flags: int) -> Optional[Pattern]:
+        """Собирает все шаблоны группы в одно выражение"""
+        parts = []
+        substrings = []
+        for pattern in patterns:
+            if pattern.startswith("re:"):
+                parts.append(f"(?:{pattern[3:]})")
+            elif pattern.startswith("glob:"):
+                parts.append(r"\A" + fnmatch.translate(pattern[5:]))
+            elif pattern.startswith("sub:"):
+                substrings.append(pattern[4:])
+            elif pattern.endswith(":"):
+                parts.append(r"\A" + re.escape(pattern))
+            elif any(c in pattern for c in GLOB_CHARS):
+                parts.append(r"\A" + fnmatch.translate(pattern))
+            else:
+                substrings.append(pattern)
+
+        if substrings:
+            # длинные подстроки первыми, чтобы общий префикс не перекрывал их
+            unique = sorted(set(substrings), key=lambda s: (-len(s), s))
+            parts.append("(?:" + "|".join(re.escape(s) for s in unique) + ")")
+
+        if not parts:
+            return None
+        try:
+            return re.compile("|".join(parts), flags)
+        except re.error as e:
+            raise ValueError(f"Некорректный шаблон фильтра: {e}")
+
+    def __bool__(self) -> bool:
+        return self._include is not None or self._exclude is not None
+
+    def allows(self, name: str) -> bool:
+        """Возвращает True, если пакет проходит фильтр"""
+        decision = self._cache.get(name)
+        if decision is None:
+            decision = ((self._include is None or self._include.search(name) is not None)
+                        and (self._exclude is None or self._exclude.search(name) is None))
+            self._cache[name] = decision
+        return decision
+
+    def describe(self) -> str:
+        """Краткое описание фильтра для вывода пользователю"""
+        parts = []
+        if self.include:
+            parts.append("включить: " + ", ".join(self.include))
+        if self.exclude:
+            parts.append("исключить: " + ", ".join(self.exclude))
+        return "; ".join(parts) or "нет"
@@ -7,6 +7,8 @@ import tarfile
 import gzip
 import urllib.request
 
+from package_filter import PackageFilter
+
 def validate_package_name(value):
     if not value.strip():
         raise argparse.ArgumentTypeError("Имя пакета не может быть пустым.")
@@ -133,9 +135,11 @@ def display_dependencies(package, version, dependencies, ascii_mode=False, filte
     
     # ФИЛЬТР 
     if filter_str:
+        patterns = [filter_str] if isinstance(filter_str, str) else filter_str
+        package_filter = PackageFilter(include=patterns, ignore_case=True)
         original_count = len(dependencies)
-        dependencies = [dep for dep in dependencies if filter_str.lower() in dep.lower()]
-        print(f"\nПрименен фильтр '{filter_str}': показано {len(dependencies)} из {original_count} зависимостей")
+        dependencies = [dep for dep in dependencies if package_filter.allows(dep)]
+        print(f"\nПрименен фильтр '{', '.join(patterns)}': показано {len(dependencies)} из {original_count} зависимостей")
     
     if not dependencies:
         print(f"\nЗависимости не найдены (возможно, пакет не имеет зависимостей или фильтр не нашёл совпадений).")
@@ -170,7 +174,8 @@ def main():
     parser.add_argument("--version", required=True, help="Версия анализируемого пакета.")
     parser.add_argument("--output", required=False, help="Имя выходного файла для графа (например, graph.png).")
     parser.add_argument("--ascii", action="store_true", help="Режим вывода зависимостей в ASCII-дереве.")
-    parser.add_argument("--filter", help="Подстрока для фильтрации пакетов.")
+    parser.add_argument("--filter", action="append",
+                        help="Шаблон для фильтрации пакетов (подстрока, маска, re:..., so:...); можно повторять.")
     
     if len(sys.argv) == 1:
         parser.print_help()
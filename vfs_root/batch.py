@@ -0,0 +1,133 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import List, Optional
+from config import VFSConfig
+from runner import run_script
+from script_cache import ScriptCache
+from snapshot import save_vfs_snapshot, load_vfs_snapshot
+
+FORK = "fork"
+SNAPSHOT = "snapshot"
+
+_settings: Optional[dict] = None
+_shared_vfs = None
+_snapshot_path: Optional[str] = None
+
+
+def _fresh_config(script: str) -> VFSConfig:
+    config = VFSConfig(root_path=_settings["root_path"], startup_script=script,
+                       vfs_file=_settings["vfs_file"])
+    config.sort_budget = _settings["sort_budget"]
+    if _snapshot_path is not None:
+        vfs, err = load_vfs_snapshot(_snapshot_path)
+        if err:
+            raise RuntimeError(err)
+        vfs.name = _settings["vfs_name"]
+        vfs.hash_value = _settings["vfs_hash"]
+        config.vfs = vfs
+    else:
+        config.vfs = _shared_vfs
+    return config
+
+
+def _init_worker(settings: dict, snapshot_path: Optional[str]):
+    global _settings, _snapshot_path
+    _settings = settings
+    _snapshot_path = snapshot_path
+
+
+def _run_one(job: tuple) -> dict:
+    script, commands, error = job
+    result = {"script": script, "status": "ok", "commands": 0, "failed_line": None, "error": None}
+    output = []
+    started = time.perf_counter()
+    try:
+        if error is not None:
+            result["status"] = "crash"
+            result["error"] = error
+        else:
+            config = _fresh_config(script)
+            result.update(run_script(commands, config, output.append))
+    except Exception as e:
+        result["status"] = "crash"
+        result["error"] = f"{type(e).__name__}: {e}"
+    if result["failed_line"] is not None:
+        result["error"] = output[-2] if output[-1].startswith("--- Script stopped") else output[-1]
+    result["seconds"] = round(time.perf_counter() - started, 6)
+    result["pid"] = os.getpid()
+    return result
+
+
+def _compile(scripts: List[str], cache: ScriptCache) -> List[tuple]:
+    jobs = []
+    for script in scripts:
+        try:
+            jobs.append((script, cache.load(script), None))
+        except Exception as e:
+            # Reported as that script's crash, as an error while running it would be.
+            jobs.append((script, None, f"{type(e).__name__}: {e}"))
+    return jobs
+
+
+def run_batch(scripts: List[str], base: VFSConfig, jobs: Optional[int] = None, share: str = FORK,
+              cache: Optional[ScriptCache] = None) -> dict:
+    global _shared_vfs
+    cache = cache or ScriptCache()
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(scripts) or 1))
+    if share == FORK and FORK not in multiprocessing.get_all_start_methods():
+        share = SNAPSHOT
+
+    settings = {
+        "root_path": base.root_path,
+        "vfs_file": base.vfs_file,
+        "sort_budget": base.sort_budget,
+        "vfs_name": base.vfs.name if base.vfs else None,
+        "vfs_hash": base.vfs.hash_value if base.vfs else None,
+    }
+    started = time.perf_counter()
+    work = _compile(scripts, cache)
+    compile_seconds = time.perf_counter() - started
+    snapshot_path = None
+    try:
+        if share == SNAPSHOT:
+            if base.vfs is not None:
+                fd, snapshot_path = tempfile.mkstemp(suffix=".vfssnap")
+                os.close(fd)
+                save_vfs_snapshot(base.vfs, snapshot_path)
+            context = multiprocessing.get_context()
+        else:
+            context = multiprocessing.get_context(FORK)
+            _shared_vfs = base.vfs
+        # maxtasksperchild=1: every script starts from a pristine copy of the image
+        with context.Pool(jobs, _init_worker, (settings, snapshot_path), maxtasksperchild=1) as pool:
+            results = pool.map(_run_one, work, chunksize=1)
+    finally:
+        _shared_vfs = None
+        if snapshot_path is not None:
+            os.remove(snapshot_path)
+
+    failed = sum(1 for r in results if r["status"] != "ok")
+    return {
+        "vfs": settings["vfs_name"],
+        "vfs_hash": settings["vfs_hash"],
+        "share": share,
+        "jobs": jobs,
+        "scripts": len(results),
+        "failed": failed,
+        "seconds": round(time.perf_counter() - started, 6),
+        "compile_seconds": round(compile_seconds, 6),
+        "script_cache": {"hits": cache.hits, "misses": cache.misses},
+        "results": results,
+    }
+
+
+def write_report(report: dict, file_path: Optional[str]):
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if file_path:
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,348 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional
+from config import VFSConfig
+from csv_shards import load_vfs_from_csv_sharded
+from loaders import load_vfs
+from runner import run_command, OK
+from script_cache import compile_line
+from synthetic import SHAPES, SAMPLE_PATHS, generate_image, load_meta
+from vfs_core import DIR, load_vfs_from_csv
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RESULTS_VERSION = 1
+REPEAT = 5
+LOAD_REPEAT = 3
+MOVES = 100
+RMDIRS = 1000
+
+
+def _peak_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _survey(vfs) -> dict:
+    # What the generator's metadata would say, for images it did not write.
+    samples, widest, largest = [], ("/", len(vfs.root.children)), (None, -1)
+    stack = [("", vfs.root)]
+    while stack:
+        path, node = stack.pop()
+        for name, child in node.children.items():
+            child_path = f"{path}/{name}"
+            if len(samples) < SAMPLE_PATHS:
+                samples.append(child_path)
+            if child.kind is DIR:
+                stack.append((child_path, child))
+                if len(child.children) > widest[1]:
+                    widest = (child_path, len(child.children))
+            elif child.content.size > largest[1]:
+                largest = (child_path, child.content.size)
+    return {"samples": samples, "widest_dir": widest[0], "largest_file": largest[0]}
+
+
+class _Sink:
+    def __init__(self):
+        self.lines = 0
+
+    def __call__(self, text: str):
+        self.lines += 1
+
+
+def _time_command(config: VFSConfig, line: str, repeat: int) -> dict:
+    command = compile_line(line)
+    runs = []
+    sink = _Sink()
+    status = OK
+    for _ in range(repeat):
+        sink.lines = 0
+        started = time.perf_counter()
+        status = run_command(command, config, sink, echo=False)
+        runs.append(time.perf_counter() - started)
+        if status != OK:
+            break
+    return {"command": line, "status": status, "first": runs[0], "best": min(runs), "lines": sink.lines}
+
+
+def bench_image(image: str, lazy: bool = False, repeat: int = REPEAT, jobs: int = 1) -> dict:
+    rss_before = _peak_rss()
+    started = time.perf_counter()
+    vfs, err = load_vfs(image, lazy=lazy, jobs=jobs)
+    if err:
+        return {"image": image, "lazy": lazy, "error": err}
+    load_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    totals = vfs.totals(vfs.root)
+    totals_seconds = time.perf_counter() - started
+    rss_loaded = _peak_rss()
+
+    meta = load_meta(image) or _survey(vfs)
+    samples = meta["samples"]
+    config = VFSConfig(vfs_file=image)
+    config.vfs = vfs
+    result = {
+        "image": os.path.basename(image),
+        "shape": meta.get("shape"),
+        "nodes": meta.get("nodes", totals[0] + totals[1]),
+        "bytes": totals[2],
+        "lazy": lazy,
+        "load_jobs": jobs,
+        "load_seconds": load_seconds,
+        "totals_seconds": totals_seconds,
+        "rss_before": rss_before,
+        "rss_loaded": rss_loaded,
+    }
+
+    vfs._path_cache.clear()
+    started = time.perf_counter()
+    found = sum(vfs.get_node(path) is not None for path in samples)
+    result["lookup_cold_us"] = (time.perf_counter() - started) / len(samples) * 1e6
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for path in samples:
+            vfs.get_node(path)
+    result["lookup_warm_us"] = (time.perf_counter() - started) / (len(samples) * repeat) * 1e6
+    result["lookup_found"] = found
+
+    commands = {}
+    widest = meta.get("widest_dir")
+    if widest:
+        config.cwd_node = vfs.get_node(widest)
+        commands["ls"] = _time_command(config, "ls", repeat)
+        config.cwd_node = None
+    largest = meta.get("largest_file")
+    if largest:
+        commands["head"] = _time_command(config, f"head -n 10 {largest}", repeat)
+        commands["tac"] = _time_command(config, f"tac {largest}", repeat)
+        commands["uniq"] = _time_command(config, f"uniq {largest}", repeat)
+    result["commands"] = commands
+
+    target = widest if widest and widest != "/" else None
+    if target:
+        started = time.perf_counter()
+        for _ in range(MOVES):
+            vfs.move_node(target, "/bench-moved")
+            vfs.move_node("/bench-moved", target)
+        result["mv_us"] = (time.perf_counter() - started) / (2 * MOVES) * 1e6
+    for i in range(RMDIRS):
+        vfs.make_dir(f"/bench-rmdir-{i}")
+    started = time.perf_counter()
+    for i in range(RMDIRS):
+        vfs.remove_dir(f"/bench-rmdir-{i}")
+    result["rmdir_us"] = (time.perf_counter() - started) / RMDIRS * 1e6
+    result["peak_rss"] = _peak_rss()
+    vfs.close()
+    return result
+
+
+def _children_cpu() -> Optional[float]:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def bench_sharded_load(image: str, lazy: bool = False, jobs: int = 0) -> dict:
+    # Serial against sharded loading of one CSV, best of LOAD_REPEAT each. The
+    # CPU time of this process is the serial part of a sharded load, placing
+    # rows; the workers' time is what more cores can spread.
+    jobs = jobs or os.cpu_count() or 1
+    serial = []
+    for _ in range(LOAD_REPEAT):
+        started = time.perf_counter()
+        vfs, err = load_vfs_from_csv(image, lazy=lazy)
+        serial.append(time.perf_counter() - started)
+        if err:
+            return {"kind": "sharded-load", "image": image, "lazy": lazy, "error": err}
+        vfs.close()
+    sharded, parent_cpu, worker_cpu = [], [], []
+    for _ in range(LOAD_REPEAT):
+        children = _children_cpu()
+        cpu = time.process_time()
+        started = time.perf_counter()
+        vfs, err = load_vfs_from_csv_sharded(image, lazy=lazy, jobs=jobs)
+        sharded.append(time.perf_counter() - started)
+        parent_cpu.append(time.process_time() - cpu)
+        if children is not None:
+            worker_cpu.append(_children_cpu() - children)
+        if err:
+            return {"kind": "sharded-load", "image": image, "lazy": lazy, "error": err}
+        vfs.close()
+    return {
+        "kind": "sharded-load",
+        "image": os.path.basename(image),
+        "lazy": lazy,
+        "load_jobs": jobs,
+        "serial_seconds": min(serial),
+        "sharded_seconds": min(sharded),
+        "speedup": min(serial) / min(sharded),
+        "parent_cpu_seconds": min(parent_cpu),
+        "worker_cpu_seconds": min(worker_cpu) if worker_cpu else None,
+    }
+
+
+def _bench_case(case: tuple) -> dict:
+    if case[0] == "sharded-load":
+        return bench_sharded_load(*case[1:])
+    return bench_image(*case)
+
+
+def run_suite(images: List[str], modes: List[bool], repeat: int = REPEAT, jobs: int = 1,
+              shard_jobs: Optional[int] = None) -> dict:
+    # Every case runs in a fresh spawned process so its peak RSS is its own;
+    # not a Pool, whose daemonic workers could not start the loader's processes.
+    cases = [(image, lazy, repeat, jobs) for image in images for lazy in modes]
+    if shard_jobs is not None:
+        cases += [("sharded-load", image, lazy, shard_jobs) for image in images
+                  if image.endswith(".csv") for lazy in modes]
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            result = pool.submit(_bench_case, case).result()
+        results.append(result)
+        _print_case(result)
+    return {
+        "version": RESULTS_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "cases": results,
+    }
+
+
+def _print_case(result: dict):
+    if "error" in result:
+        print(f"{result['image']}: {result['error']}")
+        return
+    mode = "lazy" if result["lazy"] else "eager"
+    if result.get("kind") == "sharded-load":
+        workers = result["worker_cpu_seconds"]
+        workers = f", workers {workers:.2f} s" if workers is not None else ""
+        print(f"{result['image']} [{mode}] serial load {result['serial_seconds']:.2f} s, "
+              f"{result['load_jobs']} jobs {result['sharded_seconds']:.2f} s ({result['speedup']:.2f}x); "
+              f"cpu: placing rows {result['parent_cpu_seconds']:.2f} s{workers}")
+        return
+    peak = f", peak {result['peak_rss'] / 2 ** 20:.0f} MiB" if result["peak_rss"] else ""
+    print(f"{result['image']} [{mode}] load {result['load_seconds']:.2f} s, "
+          f"lookup {result['lookup_cold_us']:.1f}/{result['lookup_warm_us']:.1f} us{peak}")
+    for name, timing in result["commands"].items():
+        print(f"  {name:<6} {timing['best'] * 1000:>10.2f} ms  ({timing['lines']} lines, {timing['status']})")
+
+
+def _metrics(case: dict) -> dict:
+    metrics = {key: case[key] for key in ("load_seconds", "totals_seconds", "lookup_cold_us",
+                                          "lookup_warm_us", "mv_us", "rmdir_us", "peak_rss",
+                                          "serial_seconds", "sharded_seconds", "parent_cpu_seconds")
+               if case.get(key) is not None}
+    for name, timing in case.get("commands", {}).items():
+        metrics[f"{name}_seconds"] = timing["best"]
+    return metrics
+
+
+def compare(old: dict, new: dict) -> List[str]:
+    def key(case):
+        return case.get("kind"), case.get("image"), case.get("lazy"), case.get("load_jobs", 1)
+
+    previous = {key(case): case for case in old.get("cases", [])}
+    lines = [f"{'case':<32} {'metric':<16} {'old':>12} {'new':>12} {'ratio':>7}"]
+    for case in new.get("cases", []):
+        before = previous.get(key(case))
+        if before is None or "error" in case or "error" in before:
+            continue
+        label = f"{case['image']} [{'lazy' if case['lazy'] else 'eager'}]"
+        if case.get("kind"):
+            label += f" {case['kind']}"
+        old_metrics = _metrics(before)
+        for metric, value in _metrics(case).items():
+            if metric not in old_metrics:
+                continue
+            base = old_metrics[metric]
+            ratio = f"{value / base:.2f}x" if base else "n/a"
+            lines.append(f"{label:<32} {metric:<16} {base:>12.6g} {value:>12.6g} {ratio:>7}")
+    return lines
+
+
+def _images(args) -> List[str]:
+    images = list(args.images)
+    for shape in args.shapes or ():
+        os.makedirs(args.workdir, exist_ok=True)
+        image = os.path.join(args.workdir, f"{shape}-{args.nodes}.csv")
+        meta = load_meta(image)
+        if meta is None or meta["params"]["nodes"] != args.nodes or meta["params"]["seed"] != args.seed:
+            print(f"generating {image}")
+            generate_image(image, shape, args.nodes, huge_bytes=args.huge_mb * 1024 * 1024, seed=args.seed)
+        images.append(image)
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VFS benchmarks over generated or existing images")
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    run = sub.add_parser("run", help="Benchmark images and write JSON results")
+    run.add_argument("images", nargs="*", help="Existing images (CSV, snapshot, directory or archive)")
+    run.add_argument("--shapes", nargs="+", choices=SHAPES, help="Generate and benchmark these shapes")
+    run.add_argument("--nodes", type=int, default=100_000, help="Nodes per generated image")
+    run.add_argument("--huge-mb", type=int, default=16, help="Size of each huge file, in MiB")
+    run.add_argument("--seed", type=int, default=1, help="Seed for generated images")
+    run.add_argument("--workdir", default="bench-images", help="Where generated images are kept")
+    run.add_argument("--mode", choices=("eager", "lazy", "both"), default="both", help="CSV loading mode")
+    run.add_argument("--load-jobs", type=int, default=1, help="CSV parsing processes (0: one per CPU)")
+    run.add_argument("--shard-jobs", type=int, default=None,
+                     help="Also time a sharded CSV load with this many processes against a serial one "
+                          "(0: one per CPU)")
+    run.add_argument("--repeat", type=int, default=REPEAT, help="Runs per command; the best is reported")
+    run.add_argument("--output", default=None, help="JSON results file (default: bench-<commit>.json)")
+
+    diff = sub.add_parser("compare", help="Compare two JSON results files")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    args = parser.parse_args()
+
+    if args.action == "compare":
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        print("\n".join(compare(old, new)))
+        return
+
+    images = _images(args)
+    if not images:
+        parser.error("no images: pass image files or --shapes")
+    modes = {"eager": [False], "lazy": [True], "both": [False, True]}[args.mode]
+    report = run_suite(images, modes, args.repeat, args.load_jobs, args.shard_jobs)
+    output = args.output or f"bench-{report['commit'] or 'results'}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import gc
+import time
+import tracemalloc
+from collections import deque
+from vfs_core import VFSNode, DIR, FILE
+
+
+class LegacyNode:
+    def __init__(self, name: str, type: str = 'dir', content=None):
+        self.name = name
+        self.type = type
+        self.content = content
+        self.children = {}
+
+
+def build_tree(make_dir, make_file, nodes: int, fanout: int):
+    root = make_dir("/")
+    pending = deque([root])
+    count = 1
+    while count < nodes:
+        parent = pending.popleft()
+        for i in range(fanout):
+            if count >= nodes:
+                break
+            if i % 8 == 0:
+                child = make_dir(f"dir{i}")
+                pending.append(child)
+            else:
+                child = make_file(f"file{i}.txt")
+            parent.children[child.name] = child
+            count += 1
+    return root
+
+
+def measure(label: str, make_dir, make_file, nodes: int, fanout: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    root = build_tree(make_dir, make_file, nodes, fanout)
+    elapsed = time.perf_counter() - started
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<8} {used / 2 ** 20:>10.1f} MiB {used / nodes:>8.1f} B/node {elapsed:>7.2f} s")
+    del root
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VFSNode memory benchmark on a synthetic tree")
+    parser.add_argument("--nodes", type=int, default=1_000_000, help="Number of nodes to build")
+    parser.add_argument("--fanout", type=int, default=64, help="Entries per directory")
+    args = parser.parse_args()
+
+    content = "SGVsbG8sIFZGUyE="
+    print(f"{args.nodes} nodes, fanout {args.fanout}")
+    legacy = measure("legacy", lambda name: LegacyNode(name, 'dir'),
+                     lambda name: LegacyNode(name, 'file', content), args.nodes, args.fanout)
+    compact = measure("compact", lambda name: VFSNode(name, DIR),
+                      lambda name: VFSNode(name, FILE, content), args.nodes, args.fanout)
+    print(f"reduction: {100 * (1 - compact / legacy):.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Union
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class LazyContent:
+    __slots__ = ('source', 'offset', 'length')
+    # True when the extent holds base64 text rather than the raw bytes.
+    encoded = True
+
+    def __init__(self, source, offset: int, length: int):
+        self.source = source
+        self.offset = offset
+        self.length = length
+
+    def read(self) -> bytes:
+        return base64.b64decode(self.source[self.offset:self.offset + self.length])
+
+
+class MappedContent(LazyContent):
+    __slots__ = ()
+    encoded = False
+
+    def read(self) -> bytes:
+        return self.source[self.offset:self.offset + self.length]
+
+
+def content_size(content) -> int:
+    # Decoded size of base64 content, from its length and padding alone.
+    if isinstance(content, MappedContent):
+        return content.length
+    if isinstance(content, LazyContent):
+        tail = content.source[content.offset:content.offset + content.length][-2:]
+        return content.length // 4 * 3 - tail.count(b'=')
+    if isinstance(content, str):
+        return len(content) // 4 * 3 - content[-2:].count('=')
+    return len(content or b'')
+
+
+class Blob:
+    # 'data' is the decoded bytes, a LazyContent extent of a mapped image, or the
+    # original base64 text when it could not be decoded at load time.
+    __slots__ = ('key', 'data', 'size', 'refs')
+
+    def __init__(self, data: Union[bytes, str, LazyContent], size: int, key: Optional[bytes] = None):
+        self.key = key
+        self.data = data
+        self.size = size
+        self.refs = 0
+
+
+class BlobStore:
+    def __init__(self):
+        self._blobs: Dict[bytes, Blob] = {}
+        self.resident_bytes = 0
+        self.mapped_bytes = 0
+        self.unkeyed = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._blobs) + self.unkeyed
+
+    def intern(self, data: bytes) -> Blob:
+        key = hashlib.sha256(data).digest()
+        blob = self._blobs.get(key)
+        if blob is None:
+            blob = self._add(Blob(data, len(data), key))
+        blob.refs += 1
+        return blob
+
+    def get(self, key: bytes) -> Optional[Blob]:
+        return self._blobs.get(key)
+
+    def adopt(self, data: Union[str, LazyContent], size: int, key: Optional[bytes] = None) -> Blob:
+        blob = self._blobs.get(key) if key is not None else None
+        if blob is None:
+            blob = self._add(Blob(data, size, key))
+        blob.refs += 1
+        return blob
+
+    def _add(self, blob: Blob) -> Blob:
+        if blob.key is None:
+            self.unkeyed += 1
+        else:
+            self._blobs[blob.key] = blob
+        if isinstance(blob.data, LazyContent):
+            self.mapped_bytes += blob.size
+        else:
+            self.resident_bytes += blob.size
+        return blob
+
+    def set_key(self, blob: Blob, key: bytes):
+        # A lazily hashed blob joins the index unless identical content is already
+        # there; it then stays unkeyed and is accounted for on its own.
+        with self._lock:
+            if blob.key is None and key not in self._blobs:
+                blob.key = key
+                self._blobs[key] = blob
+                self.unkeyed -= 1
+
+    def acquire(self, blob: Blob) -> Blob:
+        blob.refs += 1
+        return blob
+
+    def release(self, blob: Blob):
+        blob.refs -= 1
+        if blob.refs > 0:
+            return
+        if blob.key is None:
+            self.unkeyed -= 1
+        elif self._blobs.get(blob.key) is blob:
+            del self._blobs[blob.key]
+        else:
+            return
+        if isinstance(blob.data, LazyContent):
+            self.mapped_bytes -= blob.size
+        else:
+            self.resident_bytes -= blob.size
+
+
+class ContentCache:
+    def __init__(self, budget: int = DEFAULT_CACHE_BYTES):
+        self.budget = budget
+        self.used = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key: Hashable, value, size: int):
+        if size > self.budget:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.used -= old[1]
+            self._items[key] = (value, size)
+            self.used += size
+            while self.used > self.budget:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.used -= evicted
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.used -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.used = 0
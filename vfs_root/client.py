@@ -0,0 +1,48 @@
+import argparse
+import socket
+import sys
+
+# Mirrors server.END: a line starting with it closes the reply to one command.
+END = "\0"
+
+
+def _reply(reader, out) -> tuple:
+    for raw in reader:
+        line = raw.decode('utf-8', 'replace')
+        if line.startswith(END):
+            status, _, cwd = line[1:].rstrip('\n').partition('\t')
+            return status, cwd
+        out.write(line)
+    return None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Terminal client for a VFS server")
+    parser.add_argument("socket", help="Socket path the server was started with (--serve)")
+    args = parser.parse_args()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(args.socket)
+    except OSError as e:
+        print(f"Cannot connect to {args.socket}: {e}", file=sys.stderr)
+        sys.exit(1)
+    reader = sock.makefile('rb')
+    status, cwd = _reply(reader, sys.stdout)
+    interactive = sys.stdin.isatty()
+    failed = False
+    while status is not None and status != "exit":
+        try:
+            line = input(f"vfs:{cwd}$ " if interactive else "")
+        except (EOFError, KeyboardInterrupt):
+            break
+        sock.sendall(f"{line}\n".encode('utf-8'))
+        status, cwd = _reply(reader, sys.stdout)
+        sys.stdout.flush()
+        failed = failed or status not in (None, "ok", "exit")
+    sock.close()
+    sys.exit(1 if failed and not interactive else 0)
+
+
+if __name__ == "__main__":
+    main()
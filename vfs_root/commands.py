@@ -1,34 +1,24 @@
 import os
-import base64
-from typing import Tuple, List
+import re
+from collections import deque
+from datetime import datetime, timezone
+from itertools import chain, islice
+from typing import Tuple, List, Optional, Iterable, Iterator
 from config import VFSConfig
+from extsort import ExternalSorter, numeric_key
+from lines import LineReader
+from vfs_core import DIR, FILE
+from snapshot import save_vfs_snapshot
+from metrics import phase
+from journal import compacted_path
+from parser import Operator, Glob, PIPE, APPEND
 
 
-def tac(tokens: List[str], config: VFSConfig) -> Tuple[str, bool]:
-    if len(tokens) < 2:
-        return "tac: missing file operand", True
-    
-    path = tokens[1]
-    if not path.startswith('/'):
-        path = os.path.join(config.vfs_cwd, path).replace(os.sep, '/')
-    
-    content = config.vfs.read_file_content(path)
-    if content is None:
-        return f"tac: {tokens[1]}: No such file", True
-    
-    try:
-        decoded_content = base64.b64decode(content).decode('utf-8')
-        lines = decoded_content.split('\n')
-        reversed_lines = [line for line in reversed(lines) if line.strip()]
-        return '\n'.join(reversed_lines), False
-    except Exception:
-        return "tac: error decoding file content", True
+class CommandError(Exception):
+    pass
 
 
-def head(tokens: List[str], config: VFSConfig) -> Tuple[str, bool]:
-    if len(tokens) < 2:
-        return "head: missing file operand", True
-    
+def _count_option(tokens: List[str], name: str) -> Tuple[int, Optional[str]]:
     lines_count = 10
     file_index = 1
     
@@ -37,51 +27,434 @@ def head(tokens: List[str], config: VFSConfig) -> Tuple[str, bool]:
             lines_count = int(tokens[2])
             file_index = 3
         except ValueError:
-            return "head: invalid number of lines", True
-    
-    if len(tokens) <= file_index:
-        return "head: missing file operand", True
-    
-    path = tokens[file_index]
-    if not path.startswith('/'):
-        path = os.path.join(config.vfs_cwd, path).replace(os.sep, '/')
-    
-    content = config.vfs.read_file_content(path)
-    if content is None:
-        return f"head: {tokens[file_index]}: No such file", True
+            raise CommandError(f"{name}: invalid number of lines")
     
+    return lines_count, tokens[file_index] if len(tokens) > file_index else None
+
+
+def _flags(name: str, tokens: List[str], allowed: str) -> Tuple[set, List[str]]:
+    flags = set()
+    args = tokens[1:]
+    while args and args[0].startswith('-') and len(args[0]) > 1:
+        unknown = set(args[0][1:]) - set(allowed)
+        if unknown:
+            raise CommandError(f"{name}: invalid option -- '{unknown.pop()}'")
+        flags.update(args[0][1:])
+        args = args[1:]
+    return flags, args
+
+
+def _open(name: str, path: Optional[str], config: VFSConfig) -> LineReader:
+    if path is None:
+        raise CommandError(f"{name}: missing file operand")
+    with phase("resolve"):
+        reader = config.vfs.open_lines(path, config.cwd_node)
+    if reader is None:
+        raise CommandError(f"{name}: {path}: No such file")
+    return reader
+
+
+def _decoded(name: str, lines: Iterable[memoryview]) -> Iterator[str]:
     try:
-        decoded_content = base64.b64decode(content).decode('utf-8')
-        lines = decoded_content.split('\n')[:lines_count]
-        return '\n'.join(lines), False
-    except Exception:
-        return "head: error decoding file content", True
+        for line in lines:
+            yield str(line, 'utf-8')
+    except ValueError:
+        raise CommandError(f"{name}: error decoding file content")
 
 
-def uniq(tokens: List[str], config: VFSConfig) -> Tuple[str, bool]:
+def _input(name: str, path: Optional[str], config: VFSConfig, stdin: Optional[Iterator[str]]) -> Iterator[str]:
+    if path is None and stdin is not None:
+        return stdin
+    return _decoded(name, _open(name, path, config))
+
+
+def cat(tokens: List[str], config: VFSConfig, stdin: Optional[Iterator[str]] = None) -> Iterator[str]:
     if len(tokens) < 2:
-        return "uniq: missing file operand", True
-    
-    path = tokens[1]
-    if not path.startswith('/'):
-        path = os.path.join(config.vfs_cwd, path).replace(os.sep, '/')
+        yield from _input("cat", None, config, stdin)
+        return
+    readers = [_open("cat", path, config) for path in tokens[1:]]
+    for reader in readers:
+        yield from _decoded("cat", reader)
+
+
+def tac(tokens: List[str], config: VFSConfig, stdin: Optional[Iterator[str]] = None) -> Iterator[str]:
+    path = tokens[1] if len(tokens) > 1 else None
+    if path is None and stdin is not None:
+        lines = reversed(list(stdin))
+    else:
+        lines = _decoded("tac", _open("tac", path, config).reverse())
+    for text in lines:
+        if text.strip():
+            yield text
+
+
+def head(tokens: List[str], config: VFSConfig, stdin: Optional[Iterator[str]] = None) -> Iterator[str]:
+    lines_count, path = _count_option(tokens, "head")
+    lines = _input("head", path, config, stdin)
+    if lines_count >= 0:
+        yield from islice(lines, lines_count)
+    else:
+        yield from list(lines)[:lines_count]
+
+
+def tail(tokens: List[str], config: VFSConfig, stdin: Optional[Iterator[str]] = None) -> Iterator[str]:
+    lines_count, path = _count_option(tokens, "tail")
+    if lines_count < 0:
+        raise CommandError("tail: invalid number of lines")
+    if path is None and stdin is not None:
+        yield from deque(stdin, maxlen=lines_count) if lines_count else ()
+        return
+    reader = _open("tail", path, config)
+    lines = reader.reverse()
+    last = next(lines)
+    if last or not reader.size:
+        lines = chain([last], lines)
+    yield from reversed(list(_decoded("tail", islice(lines, lines_count))))
+
+
+def wc(tokens: List[str], config: VFSConfig, stdin: Optional[Iterator[str]] = None) -> Iterator[str]:
+    path = tokens[1] if len(tokens) > 1 else None
+    lines = words = size = 0
+    if path is None and stdin is not None:
+        for text in stdin:
+            lines += 1
+            words += len(text.split())
+            size += len(text.encode('utf-8')) + 1
+        yield f"{lines} {words} {size}"
+        return
+    reader = _open("wc", path, config)
+    in_word = False
+    try:
+        for chunk in reader.chunks():
+            lines += chunk.count(b'\n')
+            words += len(chunk.split())
+            if in_word and chunk[:1] and not chunk[:1].isspace():
+                words -= 1
+            in_word = bool(chunk) and not chunk[-1:].isspace()
+    except ValueError:
+        raise CommandError("wc: error decoding file content")
+    yield f"{lines} {words} {reader.size} {path}"
+
+
+def grep(tokens: List[str], config: VFSConfig, stdin: Optional[Iterator[str]] = None) -> Iterator[str]:
+    flags, args = _flags("grep", tokens, "ivnc")
+    if not args or (len(args) < 2 and stdin is None):
+        raise CommandError("grep: usage: grep [-ivnc] PATTERN [FILE]")
     
-    content = config.vfs.read_file_content(path)
-    if content is None:
-        return f"uniq: {tokens[1]}: No such file", True
+    from_file = len(args) > 1
+    try:
+        pattern = re.compile(args[0].encode('utf-8') if from_file else args[0],
+                             re.IGNORECASE if 'i' in flags else 0)
+    except re.error as e:
+        raise CommandError(f"grep: invalid pattern: {e}")
     
+    lines = _open("grep", args[1], config) if from_file else stdin
+    invert = 'v' in flags
+    count = 0
+    for number, line in enumerate(_checked("grep", lines), 1):
+        if (pattern.search(line) is not None) != invert:
+            count += 1
+            if 'c' not in flags:
+                text = str(line, 'utf-8') if from_file else line
+                yield f"{number}:{text}" if 'n' in flags else text
+    if 'c' in flags:
+        yield str(count)
+
+
+def uniq(tokens: List[str], config: VFSConfig, stdin: Optional[Iterator[str]] = None) -> Iterator[str]:
+    flags, args = _flags("uniq", tokens, "cd")
+    path = args[0] if args else None
+    from_file = not (path is None and stdin is not None)
+    lines = _open("uniq", path, config) if from_file else stdin
+    previous = None
+    count = 0
+    for line in chain(_checked("uniq", lines), [None]):
+        if count and line == previous:
+            count += 1
+            continue
+        if count and ('d' not in flags or count > 1):
+            text = str(previous, 'utf-8') if from_file else previous
+            yield f"{count:7d} {text}" if 'c' in flags else text
+        previous = bytes(line) if from_file and line is not None else line
+        count = 1
+
+
+def sort(tokens: List[str], config: VFSConfig, stdin: Optional[Iterator[str]] = None) -> Iterator[str]:
+    flags, args = _flags("sort", tokens, "rn")
+    path = args[0] if args else None
+    sorter = ExternalSorter(config.sort_budget, numeric_key if 'n' in flags else None, 'r' in flags)
     try:
-        decoded_content = base64.b64decode(content).decode('utf-8')
-        lines = decoded_content.split('\n')
-        seen = set()
-        unique_lines = []
-        for line in lines:
-            if line not in seen:
-                seen.add(line)
-                unique_lines.append(line)
-        return '\n'.join(unique_lines), False
-    except Exception:
-        return "uniq: error decoding file content", True
+        yield from sorter.sort(_input("sort", path, config, stdin))
+    except OSError as e:
+        raise CommandError(f"sort: cannot write temporary run: {e}")
+
+
+def _resolve(name: str, path: str, config: VFSConfig):
+    with phase("resolve"):
+        node = config.vfs.get_node(path, config.cwd_node)
+    if node is None:
+        raise CommandError(f"{name}: {path}: No such file or directory")
+    return node
+
+
+def _join(path: str, name: str) -> str:
+    return f"{path.rstrip('/')}/{name}" if path != "/" else f"/{name}"
+
+
+def _human(size: int) -> str:
+    for unit in "BKMGT":
+        if size < 1024 or unit == "T":
+            return f"{size}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+def du(tokens: List[str], config: VFSConfig, stdin: Optional[Iterator[str]] = None) -> Iterator[str]:
+    flags, args = _flags("du", tokens, "sh")
+    fmt = _human if 'h' in flags else str
+    vfs = config.vfs
+    for path in args or ["."]:
+        node = _resolve("du", path, config)
+        if 's' in flags or node.kind is not DIR:
+            yield f"{fmt(vfs.totals(node)[2])}\t{path}"
+            continue
+        stack = [(node, path, False)]
+        while stack:
+            current, current_path, expanded = stack.pop()
+            if expanded:
+                yield f"{fmt(vfs.totals(current)[2])}\t{current_path}"
+                continue
+            stack.append((current, current_path, True))
+            subdirs = [(name, child) for name, child in current.children.items() if child.kind is DIR]
+            for name, child in sorted(subdirs, reverse=True):
+                stack.append((child, _join(current_path, name), False))
+
+
+def tree(tokens: List[str], config: VFSConfig, stdin: Optional[Iterator[str]] = None) -> Iterator[str]:
+    args = tokens[1:]
+    max_depth = None
+    dirs_only = sizes = False
+    paths = []
+    while args:
+        arg = args.pop(0)
+        if arg == "-L":
+            try:
+                max_depth = int(args.pop(0))
+            except (IndexError, ValueError):
+                raise CommandError("tree: -L requires a positive number")
+            if max_depth < 1:
+                raise CommandError("tree: -L requires a positive number")
+        elif arg == "-d":
+            dirs_only = True
+        elif arg == "-h":
+            sizes = True
+        elif arg.startswith('-'):
+            raise CommandError(f"tree: invalid option -- '{arg}'")
+        else:
+            paths.append(arg)
+
+    path = paths[0] if paths else "."
+    node = _resolve("tree", path, config)
+    yield path
+    if node.kind is not DIR:
+        return
+
+    def entries(directory):
+        listing = sorted((name, child) for name, child in directory.children.items()
+                         if not dirs_only or child.kind is DIR)
+        return iter([(name, child, index == len(listing) - 1) for index, (name, child) in enumerate(listing)])
+
+    files = dirs = 0
+    stack = [(entries(node), "", 1)]
+    while stack:
+        listing, prefix, depth = stack[-1]
+        entry = next(listing, None)
+        if entry is None:
+            stack.pop()
+            continue
+        name, child, last = entry
+        label = f"[{_human(config.vfs.totals(child)[2]):>6}]  {name}" if sizes else name
+        yield f"{prefix}{'└── ' if last else '├── '}{label}"
+        if child.kind is DIR:
+            dirs += 1
+            if max_depth is None or depth < max_depth:
+                stack.append((entries(child), prefix + ('    ' if last else '│   '), depth + 1))
+        else:
+            files += 1
+    yield ""
+    yield f"{dirs} directories" if dirs_only else f"{dirs} directories, {files} files"
+
+
+def find(tokens: List[str], config: VFSConfig, stdin: Optional[Iterator[str]] = None) -> Iterator[str]:
+    args = tokens[1:]
+    paths = []
+    while args and not args[0].startswith('-'):
+        paths.append(args.pop(0))
+    kind = None
+    name_pattern = None
+    ignore_case = False
+    min_depth, max_depth = 0, None
+    while args:
+        option = args.pop(0)
+        if not args:
+            raise CommandError(f"find: missing argument to '{option}'")
+        value = args.pop(0)
+        if option == "-type":
+            if value not in ("f", "d"):
+                raise CommandError(f"find: unknown argument to -type: {value}")
+            kind = FILE if value == "f" else DIR
+        elif option in ("-name", "-iname"):
+            name_pattern = value
+            ignore_case = option == "-iname"
+        elif option in ("-maxdepth", "-mindepth"):
+            try:
+                depth = int(value)
+            except ValueError:
+                raise CommandError(f"find: invalid depth: {value}")
+            if option == "-maxdepth":
+                max_depth = depth
+            else:
+                min_depth = depth
+        else:
+            raise CommandError(f"find: unknown predicate '{option}'")
+
+    vfs = config.vfs
+    for path in paths or ["."]:
+        node = _resolve("find", path, config)
+        if name_pattern is not None:
+            for parts, found in vfs.find_names(name_pattern, node, ignore_case):
+                depth = len(parts)
+                if (depth >= min_depth and (max_depth is None or depth <= max_depth)
+                        and (kind is None or found.kind is kind)):
+                    yield _join(path, "/".join(parts)) if parts else path
+            continue
+        stack = [(node, path, 0)]
+        while stack:
+            current, current_path, depth = stack.pop()
+            if depth >= min_depth and (kind is None or current.kind is kind):
+                yield current_path
+            if current.kind is not DIR or (max_depth is not None and depth >= max_depth):
+                continue
+            if kind is not None:
+                # Prune subtrees with nothing of the wanted kind in them.
+                files, dirs, _ = vfs.totals(current)
+                if (kind is FILE and not files) or (kind is DIR and not dirs):
+                    continue
+            for name in sorted(current.children, reverse=True):
+                stack.append((current.children[name], _join(current_path, name), depth + 1))
+
+
+def _checked(name: str, lines: Iterable) -> Iterator:
+    try:
+        yield from lines
+    except ValueError:
+        raise CommandError(f"{name}: error decoding file content")
+
+
+STREAM_COMMANDS = {
+    "cat": cat,
+    "tac": tac,
+    "head": head,
+    "tail": tail,
+    "wc": wc,
+    "grep": grep,
+    "uniq": uniq,
+    "sort": sort,
+    "du": du,
+    "tree": tree,
+    "find": find,
+}
+
+
+MUTATING_COMMANDS = {"mv", "rmdir", "mkdir", "touch", "rm", "cp", "snapshot", "rollback", "compact"}
+
+
+def split_pipeline(tokens: List[str]) -> List[List[str]]:
+    stages = [[]]
+    for token in tokens:
+        if isinstance(token, Operator) and token == PIPE:
+            stages.append([])
+        else:
+            stages[-1].append(token)
+    return stages
+
+
+def split_redirect(tokens: List[str]) -> Tuple[List[str], Optional[str], bool]:
+    for index, token in enumerate(tokens):
+        if isinstance(token, Operator) and token != PIPE:
+            if index != len(tokens) - 2 or isinstance(tokens[-1], Operator):
+                raise CommandError(f"parse error near '{token}'")
+            return tokens[:index], str(tokens[-1]), token == APPEND
+    return tokens, None, False
+
+
+def _absolute(path: str, config: VFSConfig) -> str:
+    if path.startswith('/'):
+        return path
+    return os.path.join(config.vfs_cwd, path).replace(os.sep, '/')
+
+
+def _log(config: VFSConfig, op: str, *args):
+    if config.journal is not None:
+        config.journal.append(op, *args)
+
+
+def _stage(tokens: List[str], config: VFSConfig) -> Iterator[str]:
+    out, is_err = act(tokens, config)
+    if is_err:
+        raise CommandError(out)
+    if out:
+        yield from out.split('\n')
+
+
+def is_streaming(tokens: List[str]) -> bool:
+    return bool(tokens) and (tokens[0] in STREAM_COMMANDS or any(isinstance(t, Operator) for t in tokens))
+
+
+def is_mutating(tokens: List[str]) -> bool:
+    if tokens and tokens[0] == "time":
+        tokens = tokens[3:] if tokens[1:2] == ["-p"] else tokens[1:]
+    if any(isinstance(t, Operator) and t != PIPE for t in tokens):
+        return True
+    return any(stage and stage[0] in MUTATING_COMMANDS for stage in split_pipeline(tokens))
+
+
+def expand_globs(tokens: List[str], config: VFSConfig) -> List[str]:
+    if config.vfs is None or not any(isinstance(t, Glob) for t in tokens[1:]):
+        return tokens
+    expanded = tokens[:1]
+    with phase("resolve"):
+        for token in tokens[1:]:
+            matches = config.vfs.glob(token.pattern, config.cwd_node) if isinstance(token, Glob) else None
+            expanded.extend(matches or [token])
+    return expanded
+
+
+def execute(tokens: List[str], config: VFSConfig) -> Iterator[str]:
+    tokens, target, append = split_redirect(tokens)
+    stream = None
+    for stage in split_pipeline(expand_globs(tokens, config)):
+        if not stage:
+            raise CommandError("parse error near '|'")
+        command = STREAM_COMMANDS.get(stage[0])
+        if command is None:
+            stream = _stage(stage, config)
+        elif not config.vfs:
+            raise CommandError("VFS not loaded.")
+        else:
+            stream = command(stage, config, stream)
+    if target is None:
+        yield from stream
+        return
+    if not config.vfs:
+        raise CommandError("VFS not loaded.")
+    data = "".join(f"{line}\n" for line in stream).encode('utf-8')
+    try:
+        msg = config.vfs.write_file(target, data, config.cwd_node, append)
+    except ValueError:
+        raise CommandError(f"{target}: error decoding file content")
+    if msg:
+        raise CommandError(msg)
+    _log(config, "write", _absolute(target, config), data, append)
 
 
 def act(tokens: List[str], config: VFSConfig) -> Tuple[str, bool]:
@@ -89,59 +462,198 @@ def act(tokens: List[str], config: VFSConfig) -> Tuple[str, bool]:
         return "parse error", True
     if len(tokens) == 0:
         return "", False
+    if is_streaming(tokens):
+        out = []
+        try:
+            for line in execute(tokens, config):
+                out.append(line)
+        except CommandError as e:
+            out.append(str(e))
+            return "\n".join(out), True
+        return "\n".join(out), False
         
+    tokens = expand_globs(tokens, config)
     cmd = tokens[0]
     args = tokens[1:]
     
-    if not config.vfs and cmd not in ("exit", "conf-dump"):
+    if not config.vfs and cmd not in ("exit", "conf-dump", "stats"):
         return "VFS not loaded.", True
 
     if cmd == "exit":
         return "exit", False
     elif cmd == "vfs-info":
-        return f"VFS Name: {config.vfs.name}\nHash: {config.vfs.hash_value}\nCWD: {config.vfs_cwd}", False
+        # Mutations clear the digests on their path to the root only, so this
+        # rehashes those directories and reuses every other digest.
+        try:
+            tree_hash = config.vfs.tree_hash()
+        except ValueError as e:
+            tree_hash = f"unavailable ({e})"
+        return (f"VFS Name: {config.vfs.name}\nHash: {tree_hash}\n"
+                f"Source hash: {config.vfs.hash_value}\nCWD: {config.vfs_cwd}"), False
+    elif cmd == "vfs-hash":
+        target = args[0] if args else "."
+        with phase("resolve"):
+            node = config.vfs.get_node(target, config.cwd_node)
+        if node is None:
+            return f"vfs-hash: {target}: No such file or directory", True
+        try:
+            return f"{config.vfs.tree_hash(node)}  {target}", False
+        except ValueError as e:
+            return f"vfs-hash: {target}: {e}", True
     elif cmd == "ls":
-        target = config.vfs.get_node(config.vfs_cwd)
-        if target.type != 'dir':
+        target = config.cwd_node or config.vfs.root
+        if target.kind is not DIR:
             return "not a directory", True
         out = []
         for name, node in target.children.items():
-            out.append(f"[{'DIR' if node.type == 'dir' else 'FILE'}] {name}")
+            out.append(f"[{'DIR' if node.kind is DIR else 'FILE'}] {name}")
         return "\n".join(sorted(out)) if out else "empty", False
     elif cmd == "cd":
         if not args:
-            config.vfs_cwd = "/"
+            config.cwd_node = None
             return "", False
-        new = os.path.normpath(os.path.join(config.vfs_cwd, args[0])).replace(os.sep, '/')
-        node = config.vfs.get_node(new)
-        if node is None or node.type != 'dir':
+        with phase("resolve"):
+            node = config.vfs.get_node(args[0], config.cwd_node)
+        if node is None or node.kind is not DIR:
             return f"cd: {args[0]}: not a directory", True
-        config.vfs_cwd = new
+        config.cwd_node = node
         return "", False
     elif cmd == "rmdir":
         if not args:
             return "rmdir: missing operand", True
         path = args[0]
-        if not path.startswith('/'):
-            path = os.path.join(config.vfs_cwd, path).replace(os.sep, '/')
-        msg = config.vfs.remove_dir(path)
-        return msg, ("error" in msg.lower() or "cannot" in msg.lower())
+        msg = config.vfs.remove_dir(path, config.cwd_node)
+        if config.cwd_node is not None and not config.vfs.is_attached(config.cwd_node):
+            config.cwd_node = None
+        is_err = "error" in msg.lower() or "cannot" in msg.lower()
+        if not is_err:
+            _log(config, "rmdir", _absolute(path, config))
+        return msg, is_err
     elif cmd == "mv":
         if len(args) < 2:
             return "mv: missing file operand", True
+        if len(args) > 2:
+            return f"mv: extra operand '{args[2]}'", True
         src, dst = args
-        if not src.startswith('/'):
-            src = os.path.join(config.vfs_cwd, src).replace(os.sep, '/')
-        if not dst.startswith('/'):
-            dst = os.path.join(config.vfs_cwd, dst).replace(os.sep, '/')
-        msg = config.vfs.move_node(src, dst)
-        return msg, ("cannot" in msg.lower() or "error" in msg.lower())
-    elif cmd == "tac":
-        return tac(tokens, config)
-    elif cmd == "head":
-        return head(tokens, config)
-    elif cmd == "uniq":
-        return uniq(tokens, config)
+        msg = config.vfs.move_node(src, dst, config.cwd_node)
+        is_err = "cannot" in msg.lower() or "error" in msg.lower()
+        if not is_err:
+            _log(config, "mv", _absolute(src, config), _absolute(dst, config))
+        return msg, is_err
+    elif cmd == "cp":
+        try:
+            flags, args = _flags("cp", tokens, "rR")
+        except CommandError as e:
+            return str(e), True
+        if len(args) < 2:
+            return "cp: missing file operand", True
+        recursive = bool(flags & {'r', 'R'})
+        msg = config.vfs.copy_path(args[0], args[1], config.cwd_node, recursive)
+        if not msg.startswith("cp: copied"):
+            return msg, True
+        _log(config, "cp", _absolute(args[0], config), _absolute(args[1], config), recursive)
+        return msg, False
+    elif cmd == "mkdir":
+        try:
+            flags, args = _flags("mkdir", tokens, "p")
+        except CommandError as e:
+            return str(e), True
+        if not args:
+            return "mkdir: missing operand", True
+        out = []
+        for path in args:
+            msg = config.vfs.make_dir(path, config.cwd_node, 'p' in flags)
+            out.append(msg)
+            if "cannot" in msg:
+                return "\n".join(out), True
+            _log(config, "mkdir", _absolute(path, config), 'p' in flags)
+        return "\n".join(out), False
+    elif cmd == "touch":
+        if not args:
+            return "touch: missing file operand", True
+        for path in args:
+            msg = config.vfs.touch_file(path, config.cwd_node)
+            if msg:
+                return msg, True
+            _log(config, "touch", _absolute(path, config))
+        return "", False
+    elif cmd == "rm":
+        try:
+            flags, args = _flags("rm", tokens, "rRf")
+        except CommandError as e:
+            return str(e), True
+        if not args:
+            return "" if 'f' in flags else "rm: missing operand", 'f' not in flags
+        recursive = bool(flags & {'r', 'R'})
+        out = []
+        for path in args:
+            absolute = _absolute(path, config)
+            msg = config.vfs.remove_path(path, config.cwd_node, recursive, 'f' in flags)
+            if msg:
+                out.append(msg)
+            if "cannot" in msg:
+                return "\n".join(out), True
+            _log(config, "rm", absolute, recursive, 'f' in flags)
+        if config.cwd_node is not None and not config.vfs.is_attached(config.cwd_node):
+            config.cwd_node = None
+        return "\n".join(out), False
+    elif cmd == "echo":
+        return " ".join(args), False
+    elif cmd == "vfs-stats":
+        vfs = config.vfs
+        files, dirs, logical = vfs.totals(vfs.root)
+        physical = vfs.blobs.resident_bytes + vfs.blobs.mapped_bytes
+        ratio = f"{logical / physical:.2f}x" if physical else "n/a"
+        return (f"Files: {files}\nDirectories: {dirs}\nLogical bytes: {logical}\n"
+                f"Unique blobs: {len(vfs.blobs)}\nPhysical bytes: {physical} "
+                f"(resident {vfs.blobs.resident_bytes}, mapped {vfs.blobs.mapped_bytes})\n"
+                f"Dedup ratio: {ratio}"), False
+    elif cmd == "stats":
+        if args == ["reset"]:
+            config.stats.reset()
+            return "stats: cleared", False
+        return "\n".join(config.stats.report(args)), False
+    elif cmd == "snapshot":
+        snapshot_id = config.vfs.snapshot(" ".join(args))
+        _log(config, "snapshot", " ".join(args))
+        return f"snapshot: created snapshot {snapshot_id}", False
+    elif cmd == "snapshot-list":
+        out = []
+        for snapshot_id, label, created in config.vfs.snapshots():
+            stamp = datetime.fromtimestamp(created, timezone.utc).isoformat(timespec='seconds')
+            out.append(f"{snapshot_id}\t{stamp}\t{label}".rstrip())
+        return "\n".join(out) if out else "no snapshots", False
+    elif cmd == "rollback":
+        try:
+            snapshot_id = int(args[0]) if args else None
+        except ValueError:
+            return f"rollback: invalid snapshot id: {args[0]}", True
+        cwd = config.vfs_cwd
+        if not config.vfs.rollback(snapshot_id):
+            return f"rollback: {args[0] if args else 'latest'}: No such snapshot", True
+        snapshot_id = snapshot_id or config.vfs.snapshots()[-1][0]
+        _log(config, "rollback", snapshot_id)
+        node = config.vfs.get_node(cwd)
+        config.cwd_node = node if node is not None and node.kind is DIR and cwd != "/" else None
+        return f"rollback: restored snapshot {snapshot_id}", False
+    elif cmd == "vfs-save":
+        if not args:
+            return "vfs-save: missing file operand", True
+        try:
+            count = save_vfs_snapshot(config.vfs, args[0])
+        except Exception as e:
+            return f"vfs-save: {args[0]}: {e}", True
+        return f"vfs-save: saved {count} nodes to '{args[0]}'", False
+    elif cmd == "compact":
+        if config.journal is None:
+            return "compact: no journal is open", True
+        try:
+            folded = config.journal.compact(config.vfs, config.vfs_file)
+        except (OSError, ValueError) as e:
+            return f"compact: {config.vfs_file}: {e}", True
+        dropped = config.vfs.drop_snapshots()
+        msg = f"compact: folded {folded} journal records into '{compacted_path(config.vfs_file)}'"
+        return msg + (f"; dropped {dropped} snapshots" if dropped else ""), False
     elif cmd == "conf-dump":
         lines = [f"{k}={v}" for k, v in config.items()]
         return "\n".join(lines), False
@@ -1,6 +1,8 @@
 import os
 import sys
 from datetime import datetime, timezone
+from extsort import DEFAULT_SORT_BYTES
+from metrics import CommandStats
 
 
 class VFSConfig:
@@ -10,7 +12,26 @@ class VFSConfig:
         self.start_time = datetime.now(timezone.utc).isoformat()
         self.vfs_file = vfs_file
         self.vfs = None
-        self.vfs_cwd = "/"
+        self._cwd_node = None
+        self.journal = None
+        self.sort_budget = DEFAULT_SORT_BYTES
+        self.stats = CommandStats()
+
+    @property
+    def cwd_node(self):
+        if self.vfs is None or self._cwd_node is None:
+            return self._cwd_node
+        return self.vfs.live(self._cwd_node)
+
+    @cwd_node.setter
+    def cwd_node(self, node):
+        self._cwd_node = node
+
+    @property
+    def vfs_cwd(self) -> str:
+        if self.vfs is None or self.cwd_node is None:
+            return "/"
+        return self.vfs.path_of(self.cwd_node)
 
     def items(self):
         vfs_info = self.vfs.name if self.vfs else "None"
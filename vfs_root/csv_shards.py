@@ -0,0 +1,256 @@
+import array
+import base64
+import binascii
+import csv
+import hashlib
+import io
+import mmap
+import multiprocessing
+import os
+from typing import Dict, Tuple, Optional, List
+from blobs import LazyContent, content_size
+from name_index import NameIndex
+from vfs_core import VFS, VFSNode, DIR, FILE, CSV_FIELD_LIMIT, _HashedLines, _unsized_dir, load_vfs_from_csv
+
+SHARD_BYTES = 8 * 1024 * 1024
+SHARDS_PER_JOB = 4
+DIGEST_CHUNK = 4 * 1024 * 1024
+# Fed to the reader after a shard's last line: it comes back as a row of its
+# own only if the shard ended outside a quoted field, i.e. on a row boundary.
+SHARD_END = "\x1eshard-end\x1e"
+
+# Lengths of rows that carry no content extent: a dir row, or a file row whose
+# content comes back in the shard's extras as decoded bytes or as text.
+DIR_ROW = -1
+EXTRA_ROW = -2
+DATA, TEXT = range(2)
+
+
+class ShardTable:
+    # The rows of one shard in a few flat arrays. File contents stay in the
+    # image: a row carries the offset and length of its base64 text there and,
+    # for an eager load, the SHA-256 of the decoded bytes.
+    __slots__ = ('dirs', 'names', 'parents', 'offsets', 'lengths', 'digests', 'extras')
+
+    def __init__(self):
+        self.dirs: List[str] = []
+        self.names: List[str] = []
+        self.parents = array.array('l')
+        self.offsets = array.array('q')
+        self.lengths = array.array('q')
+        self.digests = bytearray()
+        self.extras: Dict[int, tuple] = {}
+
+
+def _digest(file_path: str) -> str:
+    # The same universal-newline hash the serial loader takes line by line; a
+    # '\r' at the end of a chunk waits for the next one in case a '\n' follows.
+    digest = hashlib.sha256()
+    carry = b''
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(DIGEST_CHUNK)
+            if not chunk:
+                break
+            chunk = carry + chunk
+            carry = b''
+            if chunk.endswith(b'\r'):
+                chunk, carry = chunk[:-1], b'\r'
+            digest.update(chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n'))
+    digest.update(carry.replace(b'\r', b'\n'))
+    return digest.hexdigest()
+
+
+def _parse_shard(task: tuple) -> Tuple[ShardTable, Optional[str], bool]:
+    # Returns the shard's rows, the first error in it and whether the shard
+    # really ended on a row boundary; rows after an error are not parsed.
+    file_path, start, end, lazy = task
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    line_count = (data.count(b'\n') + data.count(b'\r') - data.count(b'\r\n')
+                  + (not data.endswith((b'\n', b'\r'))))
+    lines = _HashedLines(io.BytesIO(data), None, start)
+    csv.field_size_limit(CSV_FIELD_LIMIT)
+    reader = csv.reader(_with_end(lines), delimiter=',')
+    table = ShardTable()
+    dirs: Dict[str, int] = {}
+    try:
+        for row in reader:
+            if row == [SHARD_END]:
+                return table, None, True
+            if len(row) != 3:
+                return table, f"Invalid number of columns in row: {row}", reader.line_num <= line_count
+            row = [item.lstrip('\ufeff') for item in row]
+            vfs_type, vfs_path, vfs_content = [r.strip() for r in row]
+            if not vfs_path.startswith('/'):
+                return table, f"Path '{vfs_path}' must start with '/'", reader.line_num <= line_count
+            if vfs_type not in ('dir', 'file'):
+                return table, f"Invalid VFS type: {vfs_type}", reader.line_num <= line_count
+            parts = [p for p in vfs_path.split('/') if p]
+            key = '/'.join(parts[:-1])
+            parent = dirs.get(key)
+            if parent is None:
+                parent = dirs[key] = len(table.dirs)
+                table.dirs.append(key)
+            index = len(table.names)
+            table.names.append(parts[-1] if parts else '/')
+            table.parents.append(parent)
+            extent = lines.content_extent(vfs_content) if vfs_type == 'file' else None
+            if vfs_type == 'dir':
+                offset, length = 0, DIR_ROW
+            elif extent is not None and lazy:
+                offset, length = extent
+            else:
+                offset, length = 0, EXTRA_ROW
+                try:
+                    decoded = base64.b64decode(vfs_content)
+                except ValueError:
+                    table.extras[index] = (TEXT, vfs_content)
+                else:
+                    if extent is not None:
+                        offset, length = extent
+                        table.digests += hashlib.sha256(decoded).digest()
+                    else:
+                        table.extras[index] = (DATA, decoded)
+            table.offsets.append(offset)
+            table.lengths.append(length)
+    except Exception as e:
+        return table, f"Error loading VFS: {e}", reader.line_num <= line_count
+    return table, None, False
+
+
+def _with_end(lines: _HashedLines):
+    yield from lines
+    yield SHARD_END + "\n"
+
+
+def _boundaries(source, start: int, shards: int) -> List[int]:
+    # Cut points just after a newline; a cut inside a quoted field is caught
+    # by the worker that parses the shard before it. Lines ended by a bare
+    # '\r' are never cut between, so such a file loads as a single shard.
+    size = len(source)
+    step = max(SHARD_BYTES, (size - start) // shards)
+    cuts = [start]
+    while cuts[-1] + step < size:
+        newline = source.find(b'\n', cuts[-1] + step)
+        if newline < 0 or newline + 1 >= size:
+            break
+        cuts.append(newline + 1)
+    cuts.append(size)
+    return cuts
+
+
+def _directory(vfs: VFS, key: str, cache: Dict[str, VFSNode]) -> VFSNode:
+    # The parent of a row, made as _place_row makes it: missing or non-directory
+    # entries on the way become directories.
+    node = cache.get(key)
+    if node is not None:
+        return node
+    node = vfs.root
+    for part in key.split('/') if key else ():
+        child = node.children.get(part)
+        if child is None:
+            vfs._insert(node, _unsized_dir(part))
+        elif child.kind is not DIR:
+            vfs._replace(node, part, _unsized_dir(part))
+        node = node.children[part]
+    cache[key] = node
+    return node
+
+
+def _apply(vfs: VFS, table: ShardTable, source, lazy: bool, cache: Dict[str, VFSNode]):
+    # Places one shard's rows in file order. Parents are resolved once per
+    # shard; only a file row replacing a directory can make a resolved parent
+    # stale, and that drops every resolution.
+    blobs, insert = vfs.blobs, vfs._insert
+    parents, offsets, lengths, extras = table.parents, table.offsets, table.lengths, table.extras
+    digests = bytes(table.digests)
+    resolved: List[Optional[VFSNode]] = [None] * len(table.dirs)
+    hashed = 0
+    for index, name in enumerate(table.names):
+        parent = resolved[parents[index]]
+        if parent is None:
+            parent = resolved[parents[index]] = _directory(vfs, table.dirs[parents[index]], cache)
+        length = lengths[index]
+        if length == DIR_ROW:
+            if name not in parent.children:
+                insert(parent, _unsized_dir(name))
+            continue
+        if length == EXTRA_ROW:
+            kind, content = extras[index]
+            if kind == DATA:
+                blob = blobs.intern(content)
+            else:
+                blob = blobs.adopt(content, content_size(content))
+        elif lazy:
+            content = LazyContent(source, offsets[index], length)
+            blob = blobs.adopt(content, content_size(content))
+        else:
+            # Identical content decodes once, on its first occurrence.
+            key = digests[hashed:hashed + 32]
+            hashed += 32
+            blob = blobs.get(key)
+            if blob is None:
+                offset = offsets[index]
+                decoded = binascii.a2b_base64(source[offset:offset + length])
+                blob = blobs.adopt(decoded, len(decoded), key)
+            else:
+                blobs.acquire(blob)
+        existing = parent.children.get(name)
+        if existing is None:
+            insert(parent, VFSNode(name, FILE, blob))
+            continue
+        vfs._replace(parent, name, VFSNode(name, FILE, blob))
+        if existing.kind is DIR:
+            cache.clear()
+            resolved = [None] * len(table.dirs)
+
+
+def load_vfs_from_csv_sharded(file_path: str, lazy: bool = False,
+                              jobs: Optional[int] = None) -> Tuple[Optional[VFS], Optional[str]]:
+    # Worker processes parse byte ranges of the CSV, and decode and hash the
+    # contents of an eager load; this process places their rows in file order,
+    # so the tree, the conflict handling and the image hash are the serial load's.
+    jobs = jobs or os.cpu_count() or 1
+    if jobs <= 1 or os.path.getsize(file_path) < 2 * SHARD_BYTES:
+        return load_vfs_from_csv(file_path, lazy=lazy)
+    vfs = VFS(name=os.path.basename(file_path))
+    vfs.root.totals = None
+    vfs._index = NameIndex()
+    source = None
+    try:
+        with open(file_path, 'rb') as f:
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            header_line = next(iter(f.readline().splitlines(keepends=True)), b'')
+        if lazy:
+            vfs._sources.append(source)
+        if next(csv.reader([header_line.decode('utf-8')]), None) != ['Type', 'Path', 'Content']:
+            vfs.close()
+            return None, "Invalid CSV header format"
+        cuts = _boundaries(source, len(header_line), jobs * SHARDS_PER_JOB)
+        tasks = [(file_path, start, end, lazy) for start, end in zip(cuts, cuts[1:])]
+        cache: Dict[str, VFSNode] = {}
+        with multiprocessing.get_context().Pool(jobs) as pool:
+            digest = pool.apply_async(_digest, (file_path,))
+            for table, error, clean in pool.imap(_parse_shard, tasks):
+                if not clean:
+                    # A quoted field spans a cut, so the later shards were cut
+                    # mid-row; only a serial read can tell where rows begin.
+                    pool.terminate()
+                    vfs.close()
+                    return load_vfs_from_csv(file_path, lazy=lazy)
+                _apply(vfs, table, source, lazy, cache)
+                if error:
+                    pool.terminate()
+                    vfs.close()
+                    return None, error
+            vfs.hash_value = digest.get()
+    except Exception as e:
+        vfs.close()
+        return None, f"Error loading VFS: {e}"
+    finally:
+        # An eager load only reads contents through the mapping while placing rows.
+        if source is not None and not lazy:
+            source.close()
+    return vfs, None
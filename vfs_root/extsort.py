@@ -0,0 +1,62 @@
+import heapq
+import re
+import tempfile
+from typing import Callable, Iterable, Iterator, List, Optional
+
+DEFAULT_SORT_BYTES = 32 * 1024 * 1024
+LINE_OVERHEAD = 64
+
+_NUMBER = re.compile(r'\s*([-+]?(?:\d+\.?\d*|\.\d+))')
+
+
+def numeric_key(line: str):
+    match = _NUMBER.match(line)
+    return (float(match.group(1)) if match else 0.0, line)
+
+
+class _Run:
+    def __init__(self, lines: List[str]):
+        self.file = tempfile.TemporaryFile()
+        self.file.writelines(line.encode('utf-8', 'surrogateescape') + b'\n' for line in lines)
+        self.file.seek(0)
+
+    def __iter__(self) -> Iterator[str]:
+        for line in self.file:
+            yield line[:-1].decode('utf-8', 'surrogateescape')
+
+    def close(self):
+        self.file.close()
+
+
+class ExternalSorter:
+    def __init__(self, budget: int = DEFAULT_SORT_BYTES, key: Optional[Callable] = None,
+                 reverse: bool = False):
+        self.budget = budget
+        self.key = key
+        self.reverse = reverse
+        self.runs: List[_Run] = []
+
+    def _spill(self, buffer: List[str]):
+        buffer.sort(key=self.key, reverse=self.reverse)
+        self.runs.append(_Run(buffer))
+
+    def sort(self, lines: Iterable[str]) -> Iterator[str]:
+        buffer = []
+        used = 0
+        try:
+            for line in lines:
+                buffer.append(line)
+                used += len(line) + LINE_OVERHEAD
+                if used >= self.budget:
+                    self._spill(buffer)
+                    buffer = []
+                    used = 0
+            buffer.sort(key=self.key, reverse=self.reverse)
+            if not self.runs:
+                yield from buffer
+                return
+            yield from heapq.merge(*self.runs, buffer, key=self.key, reverse=self.reverse)
+        finally:
+            for run in self.runs:
+                run.close()
+            self.runs = []
@@ -1,98 +1,143 @@
+import queue
+import threading
+import time
 import tkinter as tk
+from collections import deque
 from tkinter import scrolledtext
+from typing import List, Optional
 from config import VFSConfig
-from parser import parse_command
-from commands import act
+from metrics import Timing
+from runner import run_line, run_script, EXIT
+from script_cache import ScriptCache
+
+FRAME_MS = 33
+BATCH_LINES = 512
+MAX_LINES = 10000
+DRAIN_BUDGET = 0.010
+EVENT_BACKLOG = 256
 
 
 class VFSApp:
-    def __init__(self, config: VFSConfig):
+    def __init__(self, config: VFSConfig, max_lines: int = MAX_LINES, script_cache: Optional[ScriptCache] = None):
         self.config = config
+        self.script_cache = script_cache or ScriptCache()
+        self.max_lines = max_lines
         self.root = tk.Tk()
         self.root.title("VFS Shell Emulator")
         self.root.geometry("800x600")
-        
+
         self.cwd_label = tk.Label(self.root, text=f"CWD: {self.config.vfs_cwd}", anchor='w')
         self.cwd_label.pack(padx=10, pady=(10, 0), fill=tk.X)
-        
+
         self.output = scrolledtext.ScrolledText(self.root, wrap=tk.WORD)
         self.output.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
-        
+
         self.entry = tk.Entry(self.root)
         self.entry.pack(padx=10, pady=5, fill=tk.X)
         self.entry.bind("<Return>", self.execute_command)
-        
+
         self.btn = tk.Button(self.root, text="Execute", command=self.execute_command)
         self.btn.pack(pady=5)
-        
-        self._should_exit = False
+
+        self._jobs = queue.Queue()
+        self._events = queue.Queue(EVENT_BACKLOG)
+        self._batch: List[str] = []
+        self._line_count = 1
+        self._worker = threading.Thread(target=self._work, daemon=True)
 
     def write(self, text):
-        self.output.insert(tk.END, text + "\n")
+        self._batch.append(text)
+        if len(self._batch) >= BATCH_LINES:
+            self._flush()
+
+    def _flush(self):
+        if self._batch:
+            self._events.put(("text", self._batch))
+            self._batch = []
+
+    def _work(self):
+        while True:
+            work, is_script = self._jobs.get()
+            try:
+                if is_script:
+                    self.write(f"--- Running {self.config.startup_script} ---")
+                    run_script(work, self.config, self.write)
+                elif run_line(work[0], self.config, self.write) == EXIT:
+                    self.write("Bye!")
+                    self._flush()
+                    self._events.put(("exit", None))
+                    return
+            except Exception as e:
+                # A command that crashes must not take the worker, and with it
+                # every later command, down.
+                self.write(f"error: {type(e).__name__}: {e}")
+            self._flush()
+            self._events.put(("cwd", self.config.vfs_cwd))
+
+    def _drain(self):
+        batch = deque(maxlen=self.max_lines)
+        exiting = False
+        deadline = time.perf_counter() + DRAIN_BUDGET
+        while time.perf_counter() < deadline:
+            try:
+                kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "text":
+                batch.extend(payload)
+            elif kind == "cwd":
+                self.cwd_label.config(text=f"CWD: {payload}")
+            elif kind == "exit":
+                exiting = True
+
+        if batch:
+            self._insert(batch)
+        if exiting:
+            self.root.quit()
+            return
+        self.root.after(FRAME_MS, self._drain)
+
+    def _insert(self, lines):
+        # Commands only queue their output; the Tk work happens here, on the
+        # main thread, and is recorded as a render-only entry of its own.
+        timing = Timing()
+        timing.enter("render")
+        text = "\n".join(lines) + "\n"
+        self.output.insert(tk.END, text)
+        self._line_count += text.count("\n")
+        excess = self._line_count - 1 - self.max_lines
+        if excess > 0:
+            self.output.delete("1.0", f"{excess + 1}.0")
+            self._line_count -= excess
         self.output.see(tk.END)
-        self.root.update()
+        timing.exit()
+        self.config.stats.record("(tk insert)", timing.stop())
 
     def execute_command(self, event=None):
         cmdline = self.entry.get().strip()
         if cmdline == "":
             return
-            
-        self.write(f"vfs:{self.config.vfs_cwd}$ {cmdline}")
-        tokens, err = parse_command(cmdline)
-        
-        if err:
-            self.write(err)
-            self.entry.delete(0, tk.END)
-            return
-            
-        out, is_err = act(tokens, self.config)
-        
-        if out == "exit" and not is_err:
-            self.write("Bye!")
-            self.root.quit()
-            return
-            
-        self.write(out)
         self.entry.delete(0, tk.END)
-        self.cwd_label.config(text=f"CWD: {self.config.vfs_cwd}")
+        self._jobs.put(([cmdline], False))
 
     def run_script(self):
         if not self.config.startup_script:
             return
-            
+
         try:
-            with open(self.config.startup_script, "r", encoding="utf-8") as f:
-                lines = f.readlines()
+            commands = self.script_cache.load(self.config.startup_script)
         except Exception as e:
             self.write(f"Error opening script: {e}")
             return
-            
-        self.write(f"--- Running {self.config.startup_script} ---")
-        
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-                
-            self.write(f"vfs:{self.config.vfs_cwd}$ {line}")
-            tokens, err = parse_command(line)
-            
-            if err:
-                self.write(err)
-                break
-                
-            out, is_err = act(tokens, self.config)
-            self.write(out)
-            
-            if is_err:
-                self.write(f"--- Script stopped on: {line} ---")
-                break
-            if out == "exit":
-                break
+
+        self._jobs.put((commands, True))
 
     def start(self):
         self.write("=== VFS Shell Emulator ===")
         if self.config.vfs:
             self.write(f"Loaded VFS: {self.config.vfs.name}")
         self.run_script()
-        self.root.mainloop()
\ No newline at end of file
+        self._flush()
+        self._worker.start()
+        self.root.after(FRAME_MS, self._drain)
+        self.root.mainloop()
@@ -0,0 +1,202 @@
+import base64
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from vfs_core import VFS
+from snapshot import save_vfs_snapshot, snapshot_digest
+
+# Each record is (payload length, CRC-32) followed by a JSON array
+# [operation, *arguments]; a torn or corrupted tail ends the journal.
+RECORD = struct.Struct('<II')
+GROUP_RECORDS = 256
+GROUP_SECONDS = 0.05
+
+OPERATIONS = {
+    "mkdir": lambda vfs, path, parents: vfs.make_dir(path, parents=parents),
+    "touch": lambda vfs, path: vfs.touch_file(path),
+    "write": lambda vfs, path, data, append: vfs.write_file(path, data, append=append),
+    "rm": lambda vfs, path, recursive, force: vfs.remove_path(path, recursive=recursive, force=force),
+    "rmdir": lambda vfs, path: vfs.remove_dir(path),
+    "mv": lambda vfs, src, dst: vfs.move_node(src, dst),
+    "cp": lambda vfs, src, dst, recursive: vfs.copy_path(src, dst, recursive=recursive),
+    "snapshot": lambda vfs, label: vfs.snapshot(label),
+    "rollback": lambda vfs, snapshot_id: vfs.rollback(snapshot_id),
+}
+
+
+class JournalError(Exception):
+    pass
+
+
+def compacted_path(image_path: str) -> str:
+    # compact writes the folded image beside the original, which stays as it is.
+    return f"{image_path.rstrip(os.sep)}.snap"
+
+
+def _encode(op: str, args: tuple) -> bytes:
+    values = [{"b64": base64.b64encode(arg).decode('ascii')} if isinstance(arg, bytes) else arg
+              for arg in args]
+    payload = json.dumps([op, *values], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode(payload: bytes) -> list:
+    op, *values = json.loads(payload)
+    return [op] + [base64.b64decode(value["b64"]) if isinstance(value, dict) else value
+                   for value in values]
+
+
+class Journal:
+    def __init__(self, path: str, group_records: int = GROUP_RECORDS, group_seconds: float = GROUP_SECONDS):
+        self.path = path
+        self.group_records = group_records
+        self.group_seconds = group_seconds
+        self.records = 0
+        self.commits = 0
+        self._file = None
+        self._base_hash = None
+        self._pending = bytearray()
+        self._pending_records = 0
+        self._pending_since = 0.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+
+    def open(self, vfs: VFS) -> int:
+        # Replays the journal over a freshly loaded image and returns the number
+        # of records applied. The file itself is only written once there is an
+        # edit to record, so opening an image and leaving it untouched, or a
+        # journal of no edits meeting a changed image, just starts afresh.
+        records, ends = self._read()
+        self._base_hash = vfs.hash_value
+        if not records:
+            return 0
+        op, *args = records[0]
+        if op != "base":
+            raise JournalError(f"{self.path}: missing base record")
+        records = records[1:]
+        if records and records[-1][0] == "compact":
+            # Written just before the compacted image replaced the base; if that
+            # replace happened, every record here is already part of the image.
+            if records[-1][1] == vfs.hash_value:
+                return 0
+            records = records[:-1]
+            ends = ends[:-1]
+        if not records:
+            return 0
+        if args[0] != vfs.hash_value:
+            raise JournalError(f"{self.path}: journal holds {len(records)} edits made to a different image; "
+                               f"restore that image to replay them, or move the journal aside "
+                               f"(or use --no-journal) to start without them")
+        for op, *args in records:
+            operation = OPERATIONS.get(op)
+            if operation is None:
+                raise JournalError(f"{self.path}: unknown journal operation '{op}'")
+            operation(vfs, *args)
+        self._file = open(self.path, 'r+b')
+        self._file.truncate(ends[-1])
+        self._file.seek(ends[-1])
+        self.records = len(records)
+        return self.records
+
+    def image_hashes(self) -> set:
+        # Hashes of the images this journal can be replayed over: its base and,
+        # after an interrupted compact, the compacted image.
+        records, _ = self._read()
+        hashes = {records[0][1]} if records and records[0][0] == "base" else set()
+        if len(records) > 1 and records[-1][0] == "compact":
+            hashes.add(records[-1][1])
+        return hashes
+
+    def _read(self):
+        records, ends = [], []
+        end = 0
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return records, ends
+        while end + RECORD.size <= len(data):
+            length, crc = RECORD.unpack_from(data, end)
+            payload = data[end + RECORD.size:end + RECORD.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            try:
+                records.append(_decode(payload))
+            except (ValueError, TypeError, KeyError):
+                break
+            end += RECORD.size + length
+            ends.append(end)
+        return records, ends
+
+    def _reset(self, base_hash: str):
+        self._base_hash = base_hash
+        if self._file is not None:
+            self._file.close()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_encode("base", (base_hash,)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'r+b')
+        self._file.seek(0, os.SEEK_END)
+        self.records = 0
+
+    def append(self, op: str, *args):
+        record = _encode(op, args)
+        with self._lock:
+            if not self._pending_records:
+                self._pending_since = time.monotonic()
+            self._pending += record
+            self._pending_records += 1
+            due = (self._pending_records >= self.group_records
+                   or time.monotonic() - self._pending_since >= self.group_seconds)
+        if due:
+            self.commit()
+
+    def commit(self):
+        # Group commit: everything appended since the last commit, by any
+        # session, goes out in one write and one fsync; while one flush runs the
+        # next batch collects behind it.
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending_records:
+                    return
+                batch, count = self._pending, self._pending_records
+                self._pending = bytearray()
+                self._pending_records = 0
+            if self._file is None:
+                self._reset(self._base_hash)
+            self._file.write(batch)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.records += count
+            self.commits += 1
+
+    def compact(self, vfs: VFS, image_path: str) -> int:
+        # Folds the journal into a snapshot at compacted_path(image_path) and
+        # re-bases the journal on it; main loads that snapshot in place of the
+        # image while the journal refers to it.
+        with self._flush_lock:
+            self.commit()
+            folded = self.records
+            target = compacted_path(image_path)
+            tmp_path = f"{target}.compact"
+            save_vfs_snapshot(vfs, tmp_path)
+            digest = snapshot_digest(tmp_path)
+            self.append("compact", digest)
+            self.commit()
+            os.replace(tmp_path, target)
+            self._reset(digest)
+            vfs.hash_value = digest
+            return folded
+
+    def close(self):
+        with self._flush_lock:
+            self.commit()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,110 @@
+import base64
+from abc import ABC, abstractmethod
+from typing import Iterator
+from metrics import phase
+
+CHUNK_SIZE = 3 * 64 * 1024
+
+
+class BytesSource:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.size = len(data)
+
+    def chunks(self) -> Iterator[bytes]:
+        yield self.data
+
+    def chunks_reversed(self) -> Iterator[bytes]:
+        yield self.data
+
+
+class _ChunkedSource(ABC):
+    size = 0
+
+    @abstractmethod
+    def read(self, start: int, end: int) -> bytes:
+        pass
+
+    def chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        for start in range(0, self.size, chunk_size):
+            yield self.read(start, min(start + chunk_size, self.size))
+
+    def chunks_reversed(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        end = self.size
+        while end > 0:
+            start = max(0, end - chunk_size)
+            yield self.read(start, end)
+            end = start
+
+
+class MappedSource(_ChunkedSource):
+    def __init__(self, buffer, offset: int, length: int):
+        self.buffer = buffer
+        self.offset = offset
+        self.size = length
+
+    def read(self, start: int, end: int) -> bytes:
+        return self.buffer[self.offset + start:self.offset + end]
+
+
+class Base64Source(_ChunkedSource):
+    def __init__(self, buffer, offset: int, length: int):
+        self.buffer = buffer
+        self.offset = offset
+        self.length = length
+        tail = buffer[offset + length - 2:offset + length] if length else b''
+        if isinstance(tail, str):
+            tail = tail.encode('ascii')
+        self.size = length // 4 * 3 - tail.count(b'=')
+
+    def read(self, start: int, end: int) -> bytes:
+        aligned = start - start % 3
+        encoded_start = self.offset + aligned // 3 * 4
+        encoded_end = self.offset + min(self.length, -(-end // 3) * 4)
+        with phase("decode"):
+            data = base64.b64decode(self.buffer[encoded_start:encoded_end], validate=True)
+        return data[start - aligned:end - aligned]
+
+
+class LineReader:
+    def __init__(self, source):
+        self.source = source
+        self.size = source.size
+
+    def __iter__(self) -> Iterator[memoryview]:
+        return self.forward()
+
+    def chunks(self) -> Iterator[bytes]:
+        return self.source.chunks()
+
+    def forward(self) -> Iterator[memoryview]:
+        pending = b''
+        for chunk in self.source.chunks():
+            block = pending + chunk if pending else chunk
+            view = memoryview(block)
+            start = 0
+            while True:
+                end = block.find(b'\n', start)
+                if end < 0:
+                    break
+                yield view[start:end]
+                start = end + 1
+            pending = block[start:]
+        # A final newline ends the last line rather than starting an empty one.
+        if pending or not self.size:
+            yield memoryview(pending)
+
+    def reverse(self) -> Iterator[memoryview]:
+        pending = b''
+        for chunk in self.source.chunks_reversed():
+            block = chunk + pending if pending else chunk
+            view = memoryview(block)
+            end = len(block)
+            while True:
+                start = block.rfind(b'\n', 0, end)
+                if start < 0:
+                    break
+                yield view[start + 1:end]
+                end = start
+            pending = block[:end]
+        yield memoryview(pending)
@@ -0,0 +1,22 @@
+import os
+from typing import Tuple, Optional
+from vfs_core import VFS, load_vfs_from_csv
+from csv_shards import load_vfs_from_csv_sharded
+from snapshot import is_snapshot, load_vfs_snapshot
+from mounts import is_archive, load_vfs_from_archive, load_vfs_from_directory
+
+
+def load_vfs(file_path: str, lazy: bool = False, jobs: int = 1) -> Tuple[Optional[VFS], Optional[str]]:
+    # jobs is the number of CSV parsing processes; 0 means one per CPU. More
+    # processes than CPUs only compete with the one placing their rows.
+    if os.path.isdir(file_path):
+        return load_vfs_from_directory(file_path)
+    if is_snapshot(file_path):
+        return load_vfs_snapshot(file_path)
+    if is_archive(file_path):
+        return load_vfs_from_archive(file_path)
+    cpus = os.cpu_count() or 1
+    jobs = min(jobs or cpus, cpus)
+    if jobs > 1:
+        return load_vfs_from_csv_sharded(file_path, lazy=lazy, jobs=jobs)
+    return load_vfs_from_csv(file_path, lazy=lazy)
@@ -2,31 +2,94 @@ import argparse
 import sys
 import os
 from config import VFSConfig
-from vfs_core import load_vfs_from_csv
-from gui import VFSApp
+from loaders import load_vfs
+from batch import run_batch, write_report, FORK, SNAPSHOT
+from script_cache import ScriptCache
+from journal import Journal, JournalError, compacted_path
+from snapshot import is_snapshot, snapshot_digest
+from mounts import is_archive
 from samples import create_sample_scripts
 
 
 def main():
     parser = argparse.ArgumentParser(description="VFS Shell Emulator")
     parser.add_argument("--root", default=os.getcwd(), help="Root path for VFS")
-    parser.add_argument("--vfs", default="vfs_stage5.csv", help="CSV file with VFS")
+    parser.add_argument("--vfs", default="vfs_stage5.csv", help="CSV file, binary snapshot, host directory or .tar/.tar.gz/.apk archive with VFS")
     parser.add_argument("--startup", default="test_vfs_stage5.vfs", help="Startup script")
+    parser.add_argument("--lazy", action="store_true", help="Map the CSV and read file contents on first access")
+    parser.add_argument("--load-jobs", type=int, default=1,
+                        help="Processes parsing a CSV image in parallel shards (0: one per CPU)")
+    parser.add_argument("--cache-mb", type=int, default=64, help="Byte budget for lazily read contents, in MiB")
+    parser.add_argument("--sort-mb", type=int, default=32, help="Memory budget for sort before spilling runs to disk, in MiB")
+    parser.add_argument("--batch", nargs="+", metavar="SCRIPT", help="Run scripts headless, without the GUI")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes for --batch (default: CPU count)")
+    parser.add_argument("--share", choices=(FORK, SNAPSHOT), default=FORK,
+                        help="How --batch workers get their copy of the VFS")
+    parser.add_argument("--report", default=None, help="Write the --batch JSON report to this file instead of stdout")
+    parser.add_argument("--script-cache", default=None, metavar="DIR",
+                        help="Directory for compiled scripts, keyed by SHA-256 of the script text")
+    parser.add_argument("--journal", default=None, metavar="FILE",
+                        help="Write-ahead journal replayed over the image (default: <vfs>.journal; "
+                             "none for directories and archives)")
+    parser.add_argument("--no-journal", action="store_true", help="Keep edits in memory only")
+    parser.add_argument("--serve", default=None, metavar="SOCKET",
+                        help="Serve shell sessions on a local socket instead of opening the GUI")
     args = parser.parse_args()
 
     create_sample_scripts()
 
     cfg = VFSConfig(root_path=args.root, vfs_file=args.vfs, startup_script=args.startup)
+    cfg.sort_budget = args.sort_mb * 1024 * 1024
     
     if args.vfs:
-        vfs, err = load_vfs_from_csv(cfg.vfs_file)
+        journal = None
+        image = cfg.vfs_file
+        # Host directories and archives change under us between runs, so they
+        # are only journaled when a journal is named explicitly.
+        mounted = os.path.isdir(args.vfs) or is_archive(args.vfs)
+        if not args.no_journal and (args.journal or not mounted):
+            journal = Journal(args.journal or f"{args.vfs.rstrip(os.sep)}.journal")
+            compacted = compacted_path(args.vfs)
+            if is_snapshot(compacted) and snapshot_digest(compacted) in journal.image_hashes():
+                image = compacted
+                print(f"Loading compacted image {compacted}")
+        vfs, err = load_vfs(image, lazy=args.lazy, jobs=args.load_jobs)
         if err:
             print(f"Error loading VFS: {err}")
             sys.exit(1)
+        vfs.content_cache.budget = args.cache_mb * 1024 * 1024
         cfg.vfs = vfs
+        if journal is not None:
+            try:
+                replayed = journal.open(vfs)
+            except (JournalError, OSError, ValueError) as e:
+                print(f"Error replaying journal: {e}")
+                sys.exit(1)
+            if replayed:
+                print(f"Replayed {replayed} journal records from {journal.path}")
+            cfg.journal = journal
 
-    app = VFSApp(cfg)
+    script_cache = ScriptCache(args.script_cache)
+    if args.batch:
+        if cfg.journal is not None:
+            cfg.journal.close()
+            cfg.journal = None
+        report = run_batch(args.batch, cfg, jobs=args.jobs, share=args.share, cache=script_cache)
+        write_report(report, args.report)
+        sys.exit(1 if report["failed"] else 0)
+
+    if args.serve:
+        from server import serve
+        serve(args.serve, cfg)
+        if cfg.journal is not None:
+            cfg.journal.close()
+        return
+
+    from gui import VFSApp
+    app = VFSApp(cfg, script_cache=script_cache)
     app.start()
+    if cfg.journal is not None:
+        cfg.journal.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# 'format' is never entered explicitly: it is whatever a command spends
+# outside the other phases, in its own logic and in building output lines.
+PHASES = ("parse", "resolve", "decode", "format", "render")
+# Four buckets per power of two from 1 us; the last one also takes anything
+# slower than about a minute.
+BUCKETS_PER_OCTAVE = 4
+BUCKETS = 26 * BUCKETS_PER_OCTAVE
+PERCENTILES = (50, 95, 99)
+
+_local = threading.local()
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        micros = seconds * 1e6
+        index = int(math.log2(micros) * BUCKETS_PER_OCTAVE) + 1 if micros >= 1 else 0
+        self.counts[min(index, BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th percentile, capped by the
+        # slowest sample so a single call does not report a rounded-up time.
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * q / 100)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(2 ** (index / BUCKETS_PER_OCTAVE) / 1e6, self.max)
+        return self.max
+
+
+class Timing:
+    # Phase times of the command running on this thread. Phases may nest, as
+    # a decode inside a resolve would; entering one pauses the enclosing one,
+    # so no interval is counted twice. Parsing happens before the timing
+    # starts and is counted in from its measured duration.
+    def __init__(self, parse_seconds: float = 0.0):
+        self.started = time.perf_counter() - parse_seconds
+        self.seconds = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.phases["parse"] = parse_seconds
+        self._stack = []
+
+    def enter(self, name: str):
+        now = time.perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self.phases[outer[0]] += now - outer[1]
+        self._stack.append([name, now])
+
+    def exit(self):
+        now = time.perf_counter()
+        name, started = self._stack.pop()
+        self.phases[name] += now - started
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def stop(self) -> 'Timing':
+        self.seconds = time.perf_counter() - self.started
+        accounted = sum(seconds for name, seconds in self.phases.items() if name != "format")
+        self.phases["format"] = max(self.seconds - accounted, 0.0)
+        return self
+
+
+def start_timing(parse_seconds: float = 0.0) -> Timing:
+    timing = Timing(parse_seconds)
+    _local.timing = timing
+    return timing
+
+
+def stop_timing() -> Optional[Timing]:
+    timing = getattr(_local, 'timing', None)
+    _local.timing = None
+    return timing.stop() if timing is not None else None
+
+
+@contextmanager
+def phase(name: str):
+    timing = getattr(_local, 'timing', None)
+    if timing is None:
+        yield
+        return
+    timing.enter(name)
+    try:
+        yield
+    finally:
+        timing.exit()
+
+
+class _CommandStats:
+    __slots__ = ('calls', 'errors', 'latency', 'phases')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+        self.phases = {name: Histogram() for name in PHASES}
+
+
+class CommandStats:
+    # Call counts and latency histograms per command name, shared by every
+    # session of a process.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._commands: Dict[str, _CommandStats] = {}
+
+    def record(self, name: str, timing: Timing, failed: bool = False):
+        with self._lock:
+            entry = self._commands.get(name)
+            if entry is None:
+                entry = self._commands[name] = _CommandStats()
+            entry.calls += 1
+            entry.errors += failed
+            entry.latency.add(timing.seconds)
+            for phase_name, seconds in timing.phases.items():
+                if seconds:
+                    entry.phases[phase_name].add(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._commands.clear()
+
+    def report(self, names: Optional[List[str]] = None) -> List[str]:
+        header = f"{'command':<16} {'calls':>7} {'errors':>6} " + " ".join(f"{f'p{q} ms':>9}" for q in PERCENTILES)
+        lines = [header + f" {'total ms':>10}"]
+        with self._lock:
+            for name in sorted(self._commands):
+                if names and name not in names:
+                    continue
+                entry = self._commands[name]
+                lines.append(f"{name:<16} {entry.calls:>7} {entry.errors:>6} {_row(entry.latency)}")
+                for phase_name in PHASES:
+                    histogram = entry.phases[phase_name]
+                    if histogram.count:
+                        lines.append(f"  {phase_name:<14} {histogram.count:>7} {'':>6} {_row(histogram)}")
+        return lines
+
+
+def _row(histogram: Histogram) -> str:
+    values = " ".join(f"{histogram.percentile(q) * 1000:>9.3f}" for q in PERCENTILES)
+    return f"{values} {histogram.total * 1000:>10.3f}"
+
+
+def summary(timing: Timing) -> str:
+    phases = "  ".join(f"{name} {seconds * 1000:.3f}" for name, seconds in timing.phases.items())
+    return f"real {timing.seconds * 1000:.3f} ms  ({phases})"
@@ -0,0 +1,247 @@
+import bisect
+import hashlib
+import mmap
+import os
+import tarfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Tuple, Optional, List, Iterator
+from blobs import Blob, LazyContent, MappedContent
+from name_index import NameIndex
+from vfs_core import VFS, VFSNode, DIR, FILE, _unsized_dir
+
+ARCHIVE_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.apk')
+# Accept a gzip header on every member: .apk packages are several gzip
+# streams (signature, control, data) concatenated into one tar.
+GZIP_WBITS = zlib.MAX_WBITS | 32
+CHUNK = 64 * 1024
+CHECKPOINT_SPAN = 4 * 1024 * 1024
+
+
+class HostFile(LazyContent):
+    __slots__ = ()
+    encoded = False
+
+    def read(self) -> bytes:
+        with open(self.source, 'rb') as f:
+            return f.read()
+
+
+class ArchiveMember(LazyContent):
+    __slots__ = ()
+    encoded = False
+
+    def read(self) -> bytes:
+        return self.source.read(self.offset, self.length)
+
+
+def is_archive(file_path: str) -> bool:
+    return file_path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+class _GzipIndex:
+    # Random access into a gzip stream: the decompressor state is copied every
+    # CHECKPOINT_SPAN bytes of output while the archive is scanned, and reads
+    # resume from the nearest copy instead of inflating from the start.
+    def __init__(self, path: str):
+        self.path = path
+        self._outputs = [0]
+        self._points = [(0, zlib.decompressobj(GZIP_WBITS))]
+
+    def _chunks(self, f, decompressor, produced: int = 0, record: bool = False) -> Iterator[bytes]:
+        pending = b''
+        fresh = False
+        while True:
+            if decompressor.eof:
+                pending = decompressor.unused_data
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+                fresh = True
+            if not pending:
+                pending = f.read(CHUNK)
+                if not pending:
+                    return
+            try:
+                out = decompressor.decompress(pending)
+            except zlib.error:
+                if fresh:
+                    # Padding after the last member, as gzip itself tolerates.
+                    return
+                raise
+            pending = b''
+            if out:
+                fresh = False
+                produced += len(out)
+                yield out
+            if record and not decompressor.eof and produced - self._outputs[-1] >= CHECKPOINT_SPAN:
+                self._outputs.append(produced)
+                self._points.append((f.tell(), decompressor.copy()))
+
+    def scan(self, f) -> Iterator[bytes]:
+        return self._chunks(f, self._points[0][1].copy(), record=True)
+
+    def read(self, offset: int, length: int) -> bytes:
+        index = bisect.bisect_right(self._outputs, offset) - 1
+        position = self._outputs[index]
+        input_offset, state = self._points[index]
+        parts = []
+        with open(self.path, 'rb') as f:
+            f.seek(input_offset)
+            for chunk in self._chunks(f, state.copy(), position):
+                end = position + len(chunk)
+                if end > offset:
+                    parts.append(chunk[max(offset - position, 0):offset + length - position])
+                position = end
+                if position >= offset + length:
+                    break
+        return b''.join(parts)
+
+
+class _Inflated:
+    # The minimal file object tarfile's stream mode reads from.
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b''
+        self._position = 0
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        while size != 0:
+            if self._position >= len(self._buffer):
+                self._buffer = next(self._chunks, b'')
+                self._position = 0
+                if not self._buffer:
+                    break
+            end = len(self._buffer) if size < 0 else self._position + size
+            part = self._buffer[self._position:end]
+            self._position += len(part)
+            if size > 0:
+                size -= len(part)
+            parts.append(part)
+        return b''.join(parts)
+
+
+def _place(vfs: VFS, parts: List[str], blob: Optional[Blob] = None) -> VFSNode:
+    parent = vfs.root
+    for part in parts[:-1]:
+        child = parent.children.get(part)
+        if child is None or child.kind is not DIR:
+            child = _unsized_dir(part)
+            vfs._replace(parent, part, child)
+        parent = child
+    name = parts[-1]
+    existing = parent.children.get(name)
+    if blob is None:
+        if existing is not None and existing.kind is DIR:
+            return existing
+        node = _unsized_dir(name)
+    else:
+        node = VFSNode(name, FILE, blob)
+    vfs._replace(parent, name, node)
+    return node
+
+
+def _member_parts(name: str) -> Optional[List[str]]:
+    parts = [part for part in name.split('/') if part and part != '.']
+    if not parts or '..' in parts:
+        return None
+    return parts
+
+
+def load_vfs_from_archive(file_path: str) -> Tuple[Optional[VFS], Optional[str]]:
+    vfs = VFS(name=os.path.basename(file_path))
+    vfs.root.totals = None
+    vfs._index = NameIndex()
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as f:
+            if f.read(2) == b'\x1f\x8b':
+                index = _GzipIndex(file_path)
+                f.seek(0)
+                archive = tarfile.open(fileobj=_Inflated(index.scan(f)), mode='r|', ignore_zeros=True)
+
+                def content(member):
+                    return ArchiveMember(index, member.offset_data, member.size)
+            else:
+                source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                vfs._sources.append(source)
+                f.seek(0)
+                archive = tarfile.open(fileobj=f, mode='r:', ignore_zeros=True)
+
+                def content(member):
+                    return MappedContent(source, member.offset_data, member.size)
+            with archive:
+                blobs = {}
+                for member in archive:
+                    parts = _member_parts(member.name)
+                    if parts is None:
+                        continue
+                    if member.isdir():
+                        _place(vfs, parts)
+                    elif member.isreg() and not member.issparse():
+                        blob = vfs.blobs.adopt(content(member), member.size)
+                        blobs[member.name] = blob
+                        _place(vfs, parts, blob)
+                    elif member.islnk() and member.linkname in blobs:
+                        _place(vfs, parts, vfs.blobs.acquire(blobs[member.linkname]))
+                    else:
+                        # Symlinks, devices and sparse files have no place in the VFS.
+                        continue
+                    entry = f"{member.type.decode('latin-1')}{member.name}\0{member.offset_data}\0{member.size}\0"
+                    digest.update(entry.encode('utf-8', 'surrogateescape'))
+    except Exception as e:
+        return None, f"Error loading archive: {e}"
+    vfs.hash_value = digest.hexdigest()
+    return vfs, None
+
+
+def _scan(path: str) -> List[Tuple[str, bool, int, int, str]]:
+    entries = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        entries.append((entry.name, True, 0, 0, entry.path))
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        entries.append((entry.name, False, stat.st_size, stat.st_mtime_ns, entry.path))
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return entries
+
+
+def load_vfs_from_directory(dir_path: str, jobs: Optional[int] = None) -> Tuple[Optional[VFS], Optional[str]]:
+    if not os.path.isdir(dir_path):
+        return None, f"Not a directory: {dir_path}"
+    vfs = VFS(name=os.path.basename(os.path.abspath(dir_path)))
+    vfs.root.totals = None
+    vfs._index = NameIndex()
+    listing = []
+    prefix = len(os.path.join(dir_path, ''))
+    try:
+        # Directories are listed on a thread pool, where scandir and stat release
+        # the GIL; nodes are built on this thread as each listing comes back.
+        with ThreadPoolExecutor(jobs) as pool:
+            pending = {pool.submit(_scan, dir_path): vfs.root}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    parent = pending.pop(future)
+                    for name, is_dir, size, mtime, path in future.result():
+                        if is_dir:
+                            node = _unsized_dir(name)
+                            pending[pool.submit(_scan, path)] = node
+                        else:
+                            node = VFSNode(name, FILE, vfs.blobs.adopt(HostFile(path, 0, size), size))
+                        vfs._attach(parent, name, node)
+                        listing.append(f"{'d' if is_dir else 'f'}{path[prefix:]}\0{size}\0{mtime}\0")
+    except Exception as e:
+        return None, f"Error loading directory: {e}"
+    listing.sort()
+    digest = hashlib.sha256()
+    for entry in listing:
+        digest.update(entry.encode('utf-8', 'surrogateescape'))
+    vfs.hash_value = digest.hexdigest()
+    return vfs, None
@@ -0,0 +1,113 @@
+import bisect
+import fnmatch
+import re
+from typing import Dict, Iterable, List, Optional
+
+GLOB_CHARS = "*?["
+
+
+def has_magic(pattern: str) -> bool:
+    return any(c in pattern for c in GLOB_CHARS)
+
+
+def literal_prefix(pattern: str, stop: str = GLOB_CHARS) -> str:
+    for index, c in enumerate(pattern):
+        if c in stop:
+            return pattern[:index]
+    return pattern
+
+
+class NameIndex:
+    def __init__(self):
+        # name -> node, or a list of nodes when several entries share the name
+        self._entries: Dict[str, object] = {}
+        self._names: Optional[List[str]] = None
+        self._reversed: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, node):
+        entry = self._entries.get(node.name)
+        if entry is None:
+            self._entries[node.name] = node
+            self._insert_name(node.name)
+        elif isinstance(entry, list):
+            entry.append(node)
+        elif entry is not node:
+            self._entries[node.name] = [entry, node]
+
+    def discard(self, node):
+        entry = self._entries.get(node.name)
+        if entry is node:
+            del self._entries[node.name]
+            self._remove_name(node.name)
+        elif isinstance(entry, list) and node in entry:
+            entry.remove(node)
+            if len(entry) == 1:
+                self._entries[node.name] = entry[0]
+
+    def replace(self, old, new):
+        entry = self._entries.get(old.name)
+        if entry is old:
+            self._entries[old.name] = new
+        elif isinstance(entry, list):
+            entry[:] = [new if node is old else node for node in entry]
+
+    def lookup(self, name: str) -> List:
+        entry = self._entries.get(name)
+        if entry is None:
+            return []
+        return list(entry) if isinstance(entry, list) else [entry]
+
+    def names(self, pattern: str, ignore_case: bool = False) -> Iterable[str]:
+        if not has_magic(pattern) and not ignore_case:
+            return [pattern] if pattern in self._entries else []
+        regex = re.compile(fnmatch.translate(pattern), re.IGNORECASE if ignore_case else 0)
+        if ignore_case:
+            candidates = self._entries
+        else:
+            prefix = literal_prefix(pattern)
+            suffix = literal_prefix(pattern[::-1], GLOB_CHARS + ']')
+            if prefix:
+                candidates = self._range(self._sorted_names(), prefix)
+            elif suffix:
+                candidates = (name[::-1] for name in self._range(self._sorted_reversed(), suffix))
+            else:
+                candidates = self._entries
+        return [name for name in candidates if regex.match(name)]
+
+    def match(self, pattern: str, ignore_case: bool = False) -> List:
+        nodes = []
+        for name in self.names(pattern, ignore_case):
+            nodes.extend(self.lookup(name))
+        return nodes
+
+    @staticmethod
+    def _range(names: List[str], prefix: str) -> List[str]:
+        start = bisect.bisect_left(names, prefix)
+        end = bisect.bisect_left(names, prefix + '\U0010ffff', start)
+        return names[start:end]
+
+    def _sorted_names(self) -> List[str]:
+        if self._names is None:
+            self._names = sorted(self._entries)
+        return self._names
+
+    def _sorted_reversed(self) -> List[str]:
+        if self._reversed is None:
+            self._reversed = sorted(name[::-1] for name in self._entries)
+        return self._reversed
+
+    def _insert_name(self, name: str):
+        if self._names is not None:
+            bisect.insort(self._names, name)
+        if self._reversed is not None:
+            bisect.insort(self._reversed, name[::-1])
+
+    def _remove_name(self, name: str):
+        for names, key in ((self._names, name), (self._reversed, name[::-1])):
+            if names is not None:
+                index = bisect.bisect_left(names, key)
+                if index < len(names) and names[index] == key:
+                    del names[index]
@@ -1,10 +1,106 @@
-import shlex
+import re
 from typing import Tuple, Optional, List
+from name_index import has_magic
+
+_PLAIN = re.compile(r"[^ \t\r\n'\"\\|>]+")
+_WHITESPACE = " \t\r\n"
+
+
+class Operator(str):
+    pass
+
+
+class Glob(str):
+    # An unquoted word with wildcards; 'pattern' escapes the quoted parts of it.
+    def __new__(cls, text: str, pattern: str):
+        word = super().__new__(cls, text)
+        word.pattern = pattern
+        return word
+
+    def __getnewargs__(self):
+        return str(self), self.pattern
+
+
+PIPE = Operator('|')
+REDIRECT = Operator('>')
+APPEND = Operator('>>')
+OPERATORS = {op: op for op in (PIPE, REDIRECT, APPEND)}
+
+
+def _escape(text: str) -> str:
+    return re.sub(r'([*?\[])', r'[\1]', text)
+
+
+def tokenize(line: str) -> List[str]:
+    tokens = []
+    i, n = 0, len(line)
+    while i < n:
+        c = line[i]
+        if c in _WHITESPACE:
+            i += 1
+            continue
+        if c == '|':
+            tokens.append(PIPE)
+            i += 1
+            continue
+        if c == '>':
+            append = line.startswith('>>', i)
+            tokens.append(APPEND if append else REDIRECT)
+            i += 2 if append else 1
+            continue
+
+        text, pattern, magic = [], [], False
+        while i < n:
+            c = line[i]
+            if c in _WHITESPACE or c in '|>':
+                break
+            if c == "'":
+                end = line.find("'", i + 1)
+                if end < 0:
+                    raise ValueError("No closing quotation")
+                part = line[i + 1:end]
+                text.append(part)
+                pattern.append(_escape(part))
+                i = end + 1
+            elif c == '"':
+                i += 1
+                part = []
+                while True:
+                    if i >= n:
+                        raise ValueError("No closing quotation")
+                    c = line[i]
+                    if c == '"':
+                        i += 1
+                        break
+                    if c == '\\' and i + 1 < n and line[i + 1] in '"\\':
+                        c = line[i + 1]
+                        i += 1
+                    part.append(c)
+                    i += 1
+                part = ''.join(part)
+                text.append(part)
+                pattern.append(_escape(part))
+            elif c == '\\':
+                if i + 1 >= n:
+                    raise ValueError("No escaped character")
+                text.append(line[i + 1])
+                pattern.append(_escape(line[i + 1]))
+                i += 2
+            else:
+                part = _PLAIN.match(line, i).group()
+                text.append(part)
+                pattern.append(part)
+                magic = magic or has_magic(part)
+                i += len(part)
+
+        word = ''.join(text)
+        tokens.append(Glob(word, ''.join(pattern)) if magic else word)
+    return tokens
 
 
 def parse_command(line: str) -> Tuple[Optional[List[str]], Optional[str]]:
     try:
-        tokens = shlex.split(line)
+        tokens = tokenize(line)
     except ValueError as e:
         return None, f"parse error: {e}"
-    return tokens, None
\ No newline at end of file
+    return tokens, None
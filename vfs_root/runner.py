@@ -0,0 +1,135 @@
+import cProfile
+import time
+from typing import Callable, List, Optional, Tuple
+from config import VFSConfig
+from metrics import Timing, start_timing, stop_timing, phase, summary
+from commands import act, execute, split_pipeline, CommandError
+from script_cache import Command, compile_line
+
+OK = "ok"
+ERROR = "error"
+PARSE_ERROR = "parse"
+EXIT = "exit"
+RENDER_BATCH = 256
+
+
+def command_name(tokens: Optional[List[str]]) -> str:
+    if not tokens:
+        return "(parse error)" if tokens is None else "(empty)"
+    return "|".join(str(stage[0]) for stage in split_pipeline(tokens) if stage) or "(empty)"
+
+
+def run_command(command: Command, config: VFSConfig, write: Callable[[str], None], echo: bool = True,
+                parse_seconds: float = 0.0) -> str:
+    if echo:
+        write(f"vfs:{config.vfs_cwd}$ {command.line}")
+    if command.tokens and command.tokens[0] == "time":
+        return _time_command(command, config, write, parse_seconds)
+
+    return _timed(command, config, write, parse_seconds)[0]
+
+
+def _timed(command: Command, config: VFSConfig, write: Callable[[str], None],
+           parse_seconds: float = 0.0) -> Tuple[str, Timing]:
+    timing = start_timing(parse_seconds)
+    try:
+        status = _run(command, config, write)
+    finally:
+        stop_timing()
+    config.stats.record(command_name(command.tokens), timing, status in (ERROR, PARSE_ERROR))
+    return status, timing
+
+
+def _run(command: Command, config: VFSConfig, write: Callable[[str], None]) -> str:
+    if command.error:
+        write(command.error)
+        return PARSE_ERROR
+
+    if not command.streaming:
+        out, is_err = act(command.tokens, config)
+        if out == "exit" and not is_err:
+            return EXIT
+        with phase("render"):
+            write(out)
+        return ERROR if is_err else OK
+
+    # Output goes out in batches so that timing the writes costs a pair of
+    # clock reads per batch rather than per line.
+    pending = []
+
+    def flush():
+        with phase("render"):
+            for text in pending:
+                write(text)
+        pending.clear()
+
+    try:
+        for text in execute(command.tokens, config):
+            pending.append(text)
+            if len(pending) >= RENDER_BATCH:
+                flush()
+    except CommandError as e:
+        pending.append(str(e))
+        flush()
+        return ERROR
+    flush()
+    return OK
+
+
+def _time_command(command: Command, config: VFSConfig, write: Callable[[str], None], parse_seconds: float) -> str:
+    tokens = command.tokens[1:]
+    profile_path = None
+    if tokens and tokens[0] == "-p":
+        if len(tokens) < 3:
+            write("time: usage: time [-p FILE] command")
+            return ERROR
+        profile_path, tokens = str(tokens[1]), tokens[2:]
+    if not tokens:
+        write("time: missing command")
+        return ERROR
+    inner = Command(command.line.split(None, 3 if profile_path else 1)[-1], tokens, None)
+    profiler = cProfile.Profile() if profile_path else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        status, timing = _timed(inner, config, write, parse_seconds)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    write(f"time: {summary(timing)}")
+    if profiler is not None:
+        try:
+            profiler.dump_stats(profile_path)
+        except OSError as e:
+            write(f"time: {profile_path}: {e.strerror or e}")
+            return ERROR
+        write(f"time: profile written to '{profile_path}'")
+    return status
+
+
+def run_line(line: str, config: VFSConfig, write: Callable[[str], None]) -> str:
+    started = time.perf_counter()
+    command = compile_line(line)
+    status = run_command(command, config, write, parse_seconds=time.perf_counter() - started)
+    if config.journal is not None:
+        config.journal.commit()
+    return status
+
+
+def run_script(commands: List[Command], config: VFSConfig, write: Callable[[str], None]) -> dict:
+    started = time.perf_counter()
+    result = {"status": OK, "commands": 0, "failed_line": None}
+    for command in commands:
+        status = run_command(command, config, write)
+        result["commands"] += 1
+        if status == ERROR:
+            write(f"--- Script stopped on: {command.line} ---")
+        if status != OK:
+            if status != EXIT:
+                result["status"] = status
+                result["failed_line"] = command.line
+            break
+    if config.journal is not None:
+        config.journal.commit()
+    result["seconds"] = time.perf_counter() - started
+    return result
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import List, Optional
+from parser import Glob, Operator, OPERATORS, tokenize
+from commands import is_streaming
+
+CACHE_VERSION = 2
+MEMORY_ENTRIES = 256
+
+
+class Command:
+    __slots__ = ('line', 'tokens', 'error', 'streaming')
+
+    def __init__(self, line: str, tokens: Optional[List[str]], error: Optional[str]):
+        self.line = line
+        self.tokens = tokens
+        self.error = error
+        self.streaming = tokens is not None and is_streaming(tokens)
+
+    def __getstate__(self):
+        return self.line, self.tokens, self.error
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+
+def script_lines(text: str) -> List[str]:
+    lines = [line.strip() for line in text.splitlines()]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def compile_line(line: str) -> Command:
+    try:
+        return Command(line, tokenize(line), None)
+    except ValueError as e:
+        return Command(line, None, f"parse error: {e}")
+
+
+def compile_script(text: str) -> List[Command]:
+    return [compile_line(line) for line in script_lines(text)]
+
+
+def _encode(command: Command) -> list:
+    tokens = None
+    if command.tokens is not None:
+        tokens = [[str(token)] if isinstance(token, Operator)
+                  else [str(token), token.pattern] if isinstance(token, Glob)
+                  else token
+                  for token in command.tokens]
+    return [command.line, tokens, command.error]
+
+
+def _decode(entry: list) -> Command:
+    line, tokens, error = entry
+    if tokens is not None:
+        tokens = [token if isinstance(token, str)
+                  else OPERATORS[token[0]] if len(token) == 1
+                  else Glob(*token)
+                  for token in tokens]
+    return Command(line, tokens, error)
+
+
+class ScriptCache:
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+
+    def load(self, file_path: str) -> List[Command]:
+        with open(file_path, "rb") as f:
+            data = f.read()
+        return self.compile(data.decode("utf-8"), hashlib.sha256(data).hexdigest())
+
+    def compile(self, text: str, key: Optional[str] = None) -> List[Command]:
+        key = key or hashlib.sha256(text.encode("utf-8")).hexdigest()
+        commands = self._memory.get(key)
+        if commands is None:
+            commands = self._read(key)
+        if commands is None:
+            self.misses += 1
+            commands = compile_script(text)
+            self._write(key, commands)
+        else:
+            self.hits += 1
+        self._memory[key] = commands
+        self._memory.move_to_end(key)
+        if len(self._memory) > MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+        return commands
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, key: str) -> Optional[List[Command]]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            if payload.get("version") != CACHE_VERSION:
+                return None
+            return [_decode(entry) for entry in payload["commands"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write(self, key: str, commands: List[Command]):
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "commands": [_encode(c) for c in commands]}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
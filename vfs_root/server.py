@@ -0,0 +1,152 @@
+import os
+import signal
+import socketserver
+import stat
+import threading
+import time
+from contextlib import contextmanager
+from config import VFSConfig
+from commands import is_mutating
+from runner import run_command, OK, EXIT
+from script_cache import compile_line
+from vfs_core import DIR
+
+# A reply is the command's output, one line per write, then a line starting
+# with END that carries the status and the session's cwd for the next prompt.
+END = "\0"
+WRITE_BUFFER = 64 * 1024
+
+
+class RWLock:
+    # Any number of readers or a single writer. A waiting writer holds off new
+    # readers, so a steady stream of reads cannot starve it.
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting = 0
+
+    @contextmanager
+    def reading(self):
+        with self._cond:
+            while self._writer or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._cond:
+            self._waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class _Session(socketserver.StreamRequestHandler):
+    wbufsize = WRITE_BUFFER
+
+    def write(self, text: str):
+        self.wfile.write(f"{text}\n".encode('utf-8', 'replace'))
+
+    def reply(self, status: str, cwd: str):
+        self.write(f"{END}{status}\t{cwd}")
+        self.wfile.flush()
+
+    def handle(self):
+        config = self.server.session_config()
+        self.reply(OK, config.vfs_cwd)
+        try:
+            for raw in self.rfile:
+                line = raw.decode('utf-8', 'replace').strip()
+                if not line:
+                    self.reply(OK, config.vfs_cwd)
+                    continue
+                started = time.perf_counter()
+                command = compile_line(line)
+                parse_seconds = time.perf_counter() - started
+                mutating = command.tokens is not None and is_mutating(command.tokens)
+                with self.server.lock.writing() if mutating else self.server.lock.reading():
+                    self.server.restore_cwd(config)
+                    status = run_command(command, config, self.write, echo=False, parse_seconds=parse_seconds)
+                    cwd = config.vfs_cwd
+                if mutating and config.journal is not None:
+                    # Outside the lock, so writers that finish together share a flush.
+                    config.journal.commit()
+                self.reply(status, cwd)
+                if status == EXIT:
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def finish(self):
+        try:
+            super().finish()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class VFSServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, base: VFSConfig):
+        self.base = base
+        self.lock = RWLock()
+        try:
+            if stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+        super().__init__(socket_path, _Session)
+
+    def session_config(self) -> VFSConfig:
+        config = VFSConfig(root_path=self.base.root_path, vfs_file=self.base.vfs_file)
+        config.sort_budget = self.base.sort_budget
+        config.vfs = self.base.vfs
+        config.journal = self.base.journal
+        config.stats = self.base.stats
+        return config
+
+    def restore_cwd(self, config: VFSConfig):
+        # Another session may have removed or rolled back this session's cwd;
+        # follow its old path into the current tree, or fall back to the root.
+        vfs = config.vfs
+        node = config.cwd_node
+        if vfs is None or node is None or vfs.is_attached(node):
+            return
+        node = vfs.get_node(vfs.path_of(node))
+        config.cwd_node = node if node is not None and node.kind is DIR and node is not vfs.root else None
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(socket_path: str, config: VFSConfig):
+    signal.signal(signal.SIGTERM, _stop)
+    with VFSServer(socket_path, config) as server:
+        print(f"Serving {config.vfs.name if config.vfs else 'no VFS'} on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,183 @@
+import hashlib
+import mmap
+import os
+import struct
+from typing import Tuple, Optional
+from blobs import MappedContent, BlobStore
+from vfs_core import VFS, VFSNode, DIR, FILE
+
+MAGIC = b'VFSSNAP1'
+VERSION = 2
+HEADER = struct.Struct('<8sIIIQQQQQ32s')
+RECORD = struct.Struct('<IIBQQ')
+# Version 2 appends a table of unique blobs after the node table; file records
+# then hold (blob index, size) instead of (offset, length) into the blob area.
+BLOB_HEADER = struct.Struct('<Q')
+BLOB = struct.Struct('<32sQQ')
+NO_PARENT = 0xFFFFFFFF
+
+
+class _PendingDir:
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table: '_NodeTable', index: int):
+        self.table = table
+        self.index = index
+
+    def load(self, node: VFSNode) -> dict:
+        return self.table.children_of(node, self.index)
+
+
+class _NodeTable:
+    def __init__(self, source, names, nodes_offset: int, blob_offset: int, store: BlobStore,
+                 blobs_offset: Optional[int] = None):
+        self.source = source
+        self.names = names
+        self.nodes_offset = nodes_offset
+        self.blob_offset = blob_offset
+        self.blobs_offset = blobs_offset
+        self.store = store
+        self._blobs = {}
+
+    def blob(self, offset: int, length: int):
+        if self.blobs_offset is None:
+            return self.store.adopt(MappedContent(self.source, self.blob_offset + offset, length), length)
+        blob = self._blobs.get(offset)
+        if blob is None:
+            key, data_offset, size = BLOB.unpack_from(self.source, self.blobs_offset + offset * BLOB.size)
+            blob = self.store.adopt(MappedContent(self.source, self.blob_offset + data_offset, size), size, key)
+            self._blobs[offset] = blob
+        else:
+            self.store.acquire(blob)
+        return blob
+
+    def record(self, index: int):
+        return RECORD.unpack_from(self.source, self.nodes_offset + index * RECORD.size)
+
+    def children_of(self, parent: VFSNode, index: int) -> dict:
+        _, _, _, first, count = self.record(index)
+        children = {}
+        for child_index in range(first, first + count):
+            _, name_index, kind, offset, length = self.record(child_index)
+            name = self.names[name_index]
+            if kind == DIR:
+                child = VFSNode.deferred(name, _PendingDir(self, child_index))
+            else:
+                child = VFSNode(name, FILE, self.blob(offset, length))
+            child.parent = parent
+            children[child.name] = child
+        return children
+
+
+def is_snapshot(file_path: str) -> bool:
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def save_vfs_snapshot(vfs: VFS, file_path: str) -> int:
+    order = [(vfs.root, NO_PARENT)]
+    names = {}
+    blobs = {}
+    blob_table = bytearray()
+    digest = hashlib.sha256()
+    tmp_path = file_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(b'\0' * HEADER.size)
+            blob_offset = f.tell()
+            blob_length = 0
+            records = bytearray()
+            index = 0
+            while index < len(order):
+                node, parent_index = order[index]
+                name_index = names.setdefault(node.name, len(names)) if index else 0
+                if node.kind is DIR:
+                    offset, length = len(order), len(node.children)
+                    order.extend((child, index) for child in node.children.values())
+                else:
+                    key = vfs.blob_key(node.content)
+                    offset, length = blobs.get(key, len(blobs)), node.content.size
+                    if offset == len(blobs):
+                        data = vfs.read_node_content(node)
+                        blobs[key] = offset
+                        blob_table += BLOB.pack(key, blob_length, len(data))
+                        f.write(data)
+                        digest.update(data)
+                        blob_length += len(data)
+                records += RECORD.pack(parent_index, name_index, node.kind, offset, length)
+                index += 1
+
+            strings = '\0'.join(names).encode('utf-8')
+            strings_offset = f.tell()
+            f.write(strings)
+            digest.update(strings)
+            nodes_offset = f.tell()
+            f.write(records)
+            digest.update(records)
+            f.write(BLOB_HEADER.pack(len(blobs)))
+            f.write(blob_table)
+            digest.update(blob_table)
+
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, len(order), len(names), blob_offset, blob_length,
+                                strings_offset, len(strings), nodes_offset, digest.digest()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except Exception:
+        # A failed save leaves the previous image, if any, and no partial copy.
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(order)
+
+
+def snapshot_digest(file_path: str) -> str:
+    with open(file_path, 'rb') as f:
+        return HEADER.unpack(f.read(HEADER.size))[-1].hex()
+
+
+def load_vfs_snapshot(file_path: str) -> Tuple[Optional[VFS], Optional[str]]:
+    vfs = VFS(name=os.path.basename(file_path))
+    try:
+        with open(file_path, 'rb') as f:
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, node_count, name_count, blob_offset, blob_length,
+         strings_offset, strings_length, nodes_offset, digest) = HEADER.unpack_from(source, 0)
+        if magic != MAGIC:
+            source.close()
+            return None, "Not a VFS snapshot"
+        if version not in (1, VERSION):
+            source.close()
+            return None, f"Unsupported snapshot version: {version}"
+        blobs_offset = nodes_offset + node_count * RECORD.size
+        if blobs_offset > len(source):
+            source.close()
+            return None, "Truncated VFS snapshot"
+        if version == 1:
+            blobs_offset = None
+        else:
+            blob_count, = BLOB_HEADER.unpack_from(source, blobs_offset)
+            blobs_offset += BLOB_HEADER.size
+            if blobs_offset + blob_count * BLOB.size > len(source):
+                source.close()
+                return None, "Truncated VFS snapshot"
+        vfs._sources.append(source)
+
+        strings = source[strings_offset:strings_offset + strings_length].decode('utf-8')
+        names = strings.split('\0') if name_count else []
+        if len(names) != name_count:
+            return None, "Corrupted snapshot string table"
+        del vfs.root.children
+        vfs.root.totals = None
+        table = _NodeTable(source, names, nodes_offset, blob_offset, vfs.blobs, blobs_offset)
+        vfs.root.content = _PendingDir(table, 0)
+    except Exception as e:
+        return None, f"Error loading VFS snapshot: {e}"
+    vfs.hash_value = digest.hex()
+    return vfs, None
@@ -0,0 +1,203 @@
+import argparse
+import base64
+import json
+import random
+from typing import Dict, List, Optional
+
+SHAPES = ("wide", "deep", "small", "huge", "mixed")
+WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+         "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa")
+SAMPLE_PATHS = 1000
+ENCODE_CHUNK = 3 * 256 * 1024
+
+
+class ImageWriter:
+    # Streams a Type,Path,Content CSV and keeps what the benchmarks need to know
+    # about it: a reservoir of paths for lookups, the largest file and directory.
+    def __init__(self, file_path: str, seed: int):
+        self.file_path = file_path
+        self.rng = random.Random(seed)
+        self.nodes = 0
+        self.files = 0
+        self.bytes = 0
+        self.samples: List[str] = []
+        self.largest_file = (None, -1)
+        self.widest_dir: Dict[str, int] = {}
+        self._f = open(file_path, 'w', encoding='utf-8', newline='\n')
+        self._f.write("Type,Path,Content\n")
+
+    def _seen(self, path: str):
+        self.nodes += 1
+        if len(self.samples) < SAMPLE_PATHS:
+            self.samples.append(path)
+        else:
+            index = self.rng.randrange(self.nodes)
+            if index < SAMPLE_PATHS:
+                self.samples[index] = path
+        parent = path.rpartition('/')[0] or '/'
+        self.widest_dir[parent] = self.widest_dir.get(parent, 0) + 1
+
+    def dir(self, path: str):
+        self._f.write(f"dir,{path},\n")
+        self._seen(path)
+
+    def file(self, path: str, data: bytes):
+        self._f.write(f"file,{path},{base64.b64encode(data).decode('ascii')}\n")
+        self._record_file(path, len(data))
+
+    def big_file(self, path: str, size: int):
+        # Written in 3-byte aligned chunks so the base64 pieces concatenate cleanly.
+        self._f.write(f"file,{path},")
+        written = 0
+        while written < size:
+            chunk = text_block(self.rng, min(ENCODE_CHUNK, size - written))
+            self._f.write(base64.b64encode(chunk).decode('ascii'))
+            written += len(chunk)
+        self._f.write("\n")
+        self._record_file(path, written)
+
+    def _record_file(self, path: str, size: int):
+        self.files += 1
+        self.bytes += size
+        self._seen(path)
+        if size > self.largest_file[1]:
+            self.largest_file = (path, size)
+
+    def close(self, shape: str, params: dict) -> dict:
+        self._f.close()
+        widest = max(self.widest_dir.items(), key=lambda item: item[1]) if self.widest_dir else ('/', 0)
+        meta = {
+            "image": self.file_path,
+            "shape": shape,
+            "params": params,
+            "nodes": self.nodes,
+            "files": self.files,
+            "bytes": self.bytes,
+            "largest_file": self.largest_file[0],
+            "widest_dir": widest[0],
+            "widest_entries": widest[1],
+            "samples": sorted(self.samples),
+        }
+        with open(meta_path(self.file_path), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        return meta
+
+
+def meta_path(file_path: str) -> str:
+    return f"{file_path}.meta.json"
+
+
+def text_block(rng: random.Random, size: int) -> bytes:
+    # Word lines with runs of repeats, so uniq and sort have something to do;
+    # the length is a multiple of 3 unless this is the final block.
+    lines = []
+    length = 0
+    while length < size:
+        line = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randrange(10000)}\n"
+        for _ in range(1 + (rng.random() < 0.2) * rng.randrange(1, 4)):
+            lines.append(line)
+            length += len(line)
+    return ''.join(lines).encode('ascii')[:size]
+
+
+def _small_data(rng: random.Random, size: int) -> bytes:
+    return text_block(rng, max(1, int(rng.expovariate(1 / size))))
+
+
+def _wide(out: ImageWriter, nodes: int, file_bytes: int, prefix: str = "/wide"):
+    out.dir(prefix)
+    for i in range(nodes - 1):
+        out.file(f"{prefix}/f{i:07d}.txt", _small_data(out.rng, file_bytes))
+
+
+def _deep(out: ImageWriter, nodes: int, depth: int, file_bytes: int, prefix: str = "/deep"):
+    out.dir(prefix)
+    chains = max(1, (nodes - 1) // (depth + 1))
+    for chain in range(chains):
+        path = f"{prefix}/c{chain}"
+        for level in range(depth):
+            out.dir(path)
+            path = f"{path}/d{level}"
+        out.file(f"{path}.txt", _small_data(out.rng, file_bytes))
+
+
+def _small(out: ImageWriter, nodes: int, fanout: int, file_bytes: int, prefix: str = "/small"):
+    # Breadth-first tree: one entry in eight is a directory, the rest small files.
+    out.dir(prefix)
+    pending = [prefix]
+    count = 1
+    head = 0
+    while count < nodes and head < len(pending):
+        parent = pending[head]
+        head += 1
+        for i in range(fanout):
+            if count >= nodes:
+                break
+            if i % 8 == 0:
+                path = f"{parent}/d{i}"
+                out.dir(path)
+                pending.append(path)
+            else:
+                out.file(f"{parent}/f{i}.txt", _small_data(out.rng, file_bytes))
+            count += 1
+
+
+def _huge(out: ImageWriter, count: int, huge_bytes: int, prefix: str = "/huge"):
+    out.dir(prefix)
+    for i in range(count):
+        out.big_file(f"{prefix}/big{i}.log", huge_bytes)
+
+
+def generate_image(file_path: str, shape: str = "mixed", nodes: int = 100_000, fanout: int = 32,
+                   depth: int = 64, file_bytes: int = 256, huge_files: int = 2,
+                   huge_bytes: int = 16 * 1024 * 1024, seed: int = 1) -> dict:
+    if shape not in SHAPES:
+        raise ValueError(f"unknown shape '{shape}', expected one of: {', '.join(SHAPES)}")
+    params = {"nodes": nodes, "fanout": fanout, "depth": depth, "file_bytes": file_bytes,
+              "huge_files": huge_files, "huge_bytes": huge_bytes, "seed": seed}
+    out = ImageWriter(file_path, seed)
+    if shape == "wide":
+        _wide(out, nodes, file_bytes)
+    elif shape == "deep":
+        _deep(out, nodes, depth, file_bytes)
+    elif shape == "small":
+        _small(out, nodes, fanout, file_bytes)
+    elif shape == "huge":
+        _huge(out, huge_files, huge_bytes)
+    else:
+        share = max(1, nodes // 3)
+        _wide(out, share, file_bytes)
+        _deep(out, share, depth, file_bytes)
+        _small(out, nodes - 2 * share, fanout, file_bytes)
+        _huge(out, huge_files, huge_bytes)
+    return out.close(shape, params)
+
+
+def load_meta(file_path: str) -> Optional[dict]:
+    try:
+        with open(meta_path(file_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic VFS image for benchmarks")
+    parser.add_argument("output", help="CSV file to write")
+    parser.add_argument("--shape", choices=SHAPES, default="mixed", help="Tree shape")
+    parser.add_argument("--nodes", type=int, default=100_000, help="Approximate number of nodes")
+    parser.add_argument("--fanout", type=int, default=32, help="Entries per directory for 'small'")
+    parser.add_argument("--depth", type=int, default=64, help="Chain length for 'deep'")
+    parser.add_argument("--file-bytes", type=int, default=256, help="Mean size of small files")
+    parser.add_argument("--huge-files", type=int, default=2, help="Number of huge files for 'huge'")
+    parser.add_argument("--huge-mb", type=int, default=16, help="Size of each huge file, in MiB")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args()
+
+    meta = generate_image(args.output, args.shape, args.nodes, args.fanout, args.depth, args.file_bytes,
+                          args.huge_files, args.huge_mb * 1024 * 1024, args.seed)
+    print(f"{meta['image']}: {meta['nodes']} nodes, {meta['files']} files, {meta['bytes']} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import shlex
+import unittest
+from parser import Glob, PIPE, parse_command
+
+
+class TokenizerTest(unittest.TestCase):
+    def test_matches_shlex(self):
+        for line in ("ls -l /a", "cat 'a b' \"c \\\" d\" e\\ f", "head /x/y.txt",
+                     "ls\xa0b", "echo a\x0bb\x0cc", "echo \xa0 x"):
+            self.assertEqual(parse_command(line), (shlex.split(line), None), repr(line))
+
+    def test_non_posix_space_is_literal(self):
+        tokens, error = parse_command("ls\xa0b | wc")
+        self.assertIsNone(error)
+        self.assertEqual(tokens, ["ls\xa0b", "|", "wc"])
+        self.assertIs(tokens[1], PIPE)
+
+    def test_quoted_wildcards_do_not_glob(self):
+        tokens, _ = parse_command("find / -name '*.log' /a/*.txt")
+        self.assertNotIsInstance(tokens[3], Glob)
+        self.assertIsInstance(tokens[4], Glob)
+
+    def test_unclosed_quote(self):
+        tokens, error = parse_command("cat 'a")
+        self.assertIsNone(tokens)
+        self.assertIn("No closing quotation", error)
+
+
+if __name__ == "__main__":
+    unittest.main()
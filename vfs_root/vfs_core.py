@@ -1,113 +1,834 @@
+import base64
+import bisect
 import csv
+import fnmatch
 import hashlib
+import mmap
 import os
-from typing import Tuple, Optional, List
+import re
+import sys
+import threading
+import time
+from collections import ChainMap, OrderedDict
+from enum import IntEnum
+from typing import Tuple, Optional, List, Iterable, Iterator
+from blobs import LazyContent, MappedContent, ContentCache, Blob, BlobStore, content_size
+from name_index import NameIndex, has_magic, literal_prefix
+from lines import LineReader, BytesSource, MappedSource, Base64Source
+from metrics import phase
+
+
+class NodeKind(IntEnum):
+    DIR = 0
+    FILE = 1
+
+
+DIR = NodeKind.DIR
+FILE = NodeKind.FILE
+PATH_CACHE_SIZE = 4096
+# Base64 content of a large file is a single CSV field.
+CSV_FIELD_LIMIT = 2 ** 31 - 1
+# (files, dirs, bytes) below a directory, not counting the directory itself
+EMPTY_TOTALS = (0, 0, 0)
+_LOAD_LOCK = threading.Lock()
 
 
 class VFSNode:
-    def __init__(self, name: str, type: str = 'dir', content: Optional[str] = None):
-        self.name = name
-        self.type = type
-        self.content = content
-        self.children = {}
+    __slots__ = ('name', 'kind', 'parent', 'children', 'content', 'digest', 'owner', 'totals')
+
+    def __init__(self, name: str, kind: NodeKind = DIR, content: Optional[Blob] = None):
+        self.name = sys.intern(name)
+        self.kind = kind
+        self.parent = None
+        self.digest = None
+        self.owner = None
+        if kind is DIR:
+            self.children = {}
+            self.content = None
+            self.totals = EMPTY_TOTALS
+        else:
+            self.totals = None
+            self.children = None
+            self.content = content
+
+    @classmethod
+    def deferred(cls, name: str, loader) -> 'VFSNode':
+        node = cls.__new__(cls)
+        node.name = sys.intern(name)
+        node.kind = DIR
+        node.parent = None
+        node.digest = None
+        node.owner = None
+        node.totals = None
+        node.content = loader
+        return node
+
+    def copy(self, owner) -> 'VFSNode':
+        node = VFSNode.__new__(VFSNode)
+        node.name = self.name
+        node.kind = self.kind
+        node.parent = None
+        node.digest = None
+        node.owner = owner
+        node.totals = self.totals
+        if self.kind is DIR:
+            node.children = dict(self.children)
+            node.content = None
+        else:
+            node.children = None
+            node.content = self.content
+        return node
+
+    def __getattr__(self, attr: str):
+        # Directories mounted from a snapshot leave 'children' unset and keep a
+        # pending loader in 'content' until their entries are first needed.
+        if attr == 'children' and self.kind is DIR and self.content is not None:
+            # Concurrent readers must not each build their own set of children.
+            with _LOAD_LOCK:
+                if self.content is not None:
+                    self.children = self.content.load(self)
+                    self.content = None
+            return self.children
+        raise AttributeError(attr)
+
+    @property
+    def type(self) -> str:
+        return 'dir' if self.kind is DIR else 'file'
 
 
 class VFS:
     def __init__(self, name: str = "Unnamed VFS"):
         self.name = name
-        self.root = VFSNode("/", 'dir')
+        self.root = VFSNode("/", DIR)
         self.current_dir = self.root
         self.hash_value = ""
-        self.raw_data_string = ""
-
-    def calculate_hash(self):
-        self.hash_value = hashlib.sha256(self.raw_data_string.encode('utf-8')).hexdigest()
-        return self.hash_value
-
-    def get_node(self, path: str) -> Optional[VFSNode]:
-        if path == "" or path == "/":
-            return self.root
-        path_parts = [p for p in path.strip('/').split('/') if p]
-        current_node = self.root
-        for part in path_parts:
-            if current_node.type != 'dir':
-                return None
-            if part in current_node.children:
-                current_node = current_node.children[part]
+        self.content_cache = ContentCache()
+        self.blobs = BlobStore()
+        self._path_cache = OrderedDict()
+        self._sources = _Sources()
+        # Copy-on-write state: nodes whose owner is not self._gen are shared with
+        # a snapshot or fork and are path-copied before the first mutation;
+        # _remap sends each replaced node to its copy in this version.
+        self._gen = None
+        self._remap = ChainMap()
+        self._snapshots = []
+        self._index: Optional[NameIndex] = None
+        self._listings = OrderedDict()
+
+    def live(self, node: Optional[VFSNode]) -> Optional[VFSNode]:
+        while node is not None and node.owner is not self._gen:
+            copy = self._remap.get(node)
+            if copy is None:
+                break
+            node = copy
+        return node
+
+    def parent_of(self, node: VFSNode) -> Optional[VFSNode]:
+        return self.live(node.parent)
+
+    def _writable(self, node: VFSNode) -> VFSNode:
+        if node.owner is self._gen:
+            return node
+        node = self.live(node)
+        shared = []
+        while node is not None and node.owner is not self._gen:
+            shared.append(node)
+            node = self.parent_of(node)
+        parent = node
+        self._touch(parent)
+        for original in reversed(shared):
+            copy = original.copy(self._gen)
+            self._remap[original] = copy
+            if self._index is not None:
+                self._index.replace(original, copy)
+            if parent is None:
+                self.root = self.current_dir = copy
             else:
+                copy.parent = parent
+                parent.children[copy.name] = copy
+            parent = copy
+        return parent
+
+    def _own(self, node: VFSNode) -> VFSNode:
+        if node.owner is self._gen:
+            return node
+        if node.parent is None and node is not self.root:
+            node.owner = self._gen
+            return node
+        copy = node.copy(self._gen)
+        self._remap[node] = copy
+        if self._index is not None:
+            self._index.replace(node, copy)
+        if copy.kind is FILE:
+            self.blobs.acquire(copy.content)
+        return copy
+
+    def _new_generation(self):
+        self._gen = object()
+        self._remap = self._remap.new_child()
+        self._path_cache.clear()
+
+    def snapshot(self, label: Optional[str] = None) -> int:
+        snapshot_id = self._snapshots[-1][0] + 1 if self._snapshots else 1
+        self._snapshots.append((snapshot_id, label or "", time.time(), self.root, self._remap))
+        self._new_generation()
+        return snapshot_id
+
+    def snapshots(self) -> List[Tuple[int, str, float]]:
+        return [(snapshot_id, label, created) for snapshot_id, label, created, _, _ in self._snapshots]
+
+    def rollback(self, snapshot_id: Optional[int] = None) -> bool:
+        for index, (current_id, _, _, root, remap) in enumerate(self._snapshots):
+            if snapshot_id is None and index == len(self._snapshots) - 1 or current_id == snapshot_id:
+                del self._snapshots[index + 1:]
+                self.root = root
+                self.current_dir = root
+                self._remap = remap
+                self._index = None
+                self._new_generation()
+                return True
+        return False
+
+    def drop_snapshots(self) -> int:
+        count = len(self._snapshots)
+        self._snapshots = []
+        return count
+
+    def fork(self, name: Optional[str] = None) -> 'VFS':
+        other = VFS.__new__(VFS)
+        other.name = name or self.name
+        other.root = self.root
+        other.current_dir = self.root
+        other.hash_value = self.hash_value
+        other.content_cache = ContentCache(self.content_cache.budget)
+        other.blobs = self.blobs
+        other._path_cache = OrderedDict()
+        # Lazy contents of both point into the same mappings, which stay open
+        # until the last of the two is closed.
+        other._sources = self._sources
+        self._sources.users += 1
+        other._gen = None
+        other._remap = self._remap
+        other._snapshots = []
+        other._index = None
+        other._listings = OrderedDict()
+        other._new_generation()
+        self._new_generation()
+        return other
+
+    def get_node(self, path: str, base: Optional[VFSNode] = None) -> Optional[VFSNode]:
+        if base is not None and not path.startswith('/'):
+            return self._walk(self.live(base), path)
+        cached = self._path_cache.get(path)
+        if cached is not None:
+            try:
+                self._path_cache.move_to_end(path)
+            except KeyError:
+                # Evicted by a concurrent reader in the meantime.
+                pass
+            return self.live(cached[0])
+        node = self._walk(self.root, path)
+        if node is not None and '..' not in path:
+            self._path_cache[path] = (node, self.path_of(node))
+            if len(self._path_cache) > PATH_CACHE_SIZE:
+                self._path_cache.popitem(last=False)
+        return node
+
+    def _walk(self, node: VFSNode, path: str) -> Optional[VFSNode]:
+        for part in path.split('/'):
+            if not part or part == '.':
+                continue
+            if node.kind is not DIR:
                 return None
-        return current_node
+            if part == '..':
+                node = self.parent_of(node) or node
+                continue
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def path_of(self, node: VFSNode) -> str:
+        parts = []
+        node = self.live(node)
+        while node.parent is not None:
+            parts.append(node.name)
+            node = self.parent_of(node)
+        return "/" + "/".join(reversed(parts))
+
+    def is_attached(self, node: VFSNode) -> bool:
+        node = self.live(node)
+        while node.parent is not None:
+            parent = self.parent_of(node)
+            if parent.children.get(node.name) is not node:
+                return False
+            node = parent
+        return node is self.root
+
+    def _invalidate(self, path: str):
+        prefix = path.rstrip('/') + '/'
+        stale = [key for key, (_, resolved) in self._path_cache.items()
+                 if resolved == path or resolved.startswith(prefix)]
+        for key in stale:
+            del self._path_cache[key]
+
+    def _touch(self, node: Optional[VFSNode]):
+        while node is not None and node.digest is not None:
+            node.digest = None
+            node = node.parent
+
+    def _adjust(self, node: Optional[VFSNode], files: int, dirs: int, size: int):
+        # A directory without totals has none on any ancestor either, so the walk
+        # can stop at the first one; they are computed on demand by totals().
+        while node is not None and node.totals is not None:
+            node_files, node_dirs, node_size = node.totals
+            node.totals = (node_files + files, node_dirs + dirs, node_size + size)
+            node = node.parent
+
+    def _attach(self, parent: VFSNode, name: str, node: VFSNode):
+        parent = self._writable(parent)
+        node = self._own(node)
+        node.name = sys.intern(name)
+        node.parent = parent
+        previous = parent.children.get(node.name)
+        parent.children[node.name] = node
+        self._touch(parent)
+        self._listings.pop(parent, None)
+        if previous is not None and previous.kind is DIR:
+            # A row or member replacing a directory takes its whole subtree out.
+            self._invalidate(self.path_of(node))
+        if self._index is not None:
+            if previous is not None:
+                self._unindex(previous)
+            self._index.add(node)
+        if parent.totals is not None:
+            self._adjust(parent, *self.subtree_totals(node))
+
+    def _replace(self, parent: VFSNode, name: str, node: VFSNode):
+        # Loaders put a row or member over whatever holds its name, which gives
+        # up its blobs first so the store's refcounts stay exact.
+        previous = parent.children.get(name)
+        if previous is not None:
+            self._drop(previous)
+        self._attach(parent, name, node)
+
+    def _insert(self, parent: VFSNode, node: VFSNode):
+        # _attach for loaders placing a fresh node under a name that is free, in
+        # a directory of this version: there is nothing to copy or replace.
+        if parent.owner is not self._gen:
+            self._attach(parent, node.name, node)
+            return
+        node.parent = parent
+        node.owner = self._gen
+        parent.children[node.name] = node
+        if parent.digest is not None:
+            self._touch(parent)
+        self._listings.pop(parent, None)
+        if self._index is not None:
+            self._index.add(node)
+        if parent.totals is not None:
+            self._adjust(parent, *self.subtree_totals(node))
+
+    def _detach(self, node: VFSNode):
+        node = self.live(node)
+        self._invalidate(self.path_of(node))
+        parent = self._writable(self.parent_of(node))
+        del parent.children[node.name]
+        self._touch(parent)
+        self._listings.pop(parent, None)
+        if self._index is not None:
+            self._index.discard(node)
+        if parent.totals is not None:
+            files, dirs, size = self.subtree_totals(node)
+            self._adjust(parent, -files, -dirs, -size)
+        if node.owner is self._gen:
+            node.parent = None
+
+    def node_size(self, node: VFSNode) -> int:
+        if node.totals is None:
+            node.totals = (1, 0, node.content.size)
+        return node.totals[2]
+
+    def totals(self, node: VFSNode) -> Tuple[int, int, int]:
+        if node.kind is FILE:
+            self.node_size(node)
+            return node.totals
+        stack = [(node, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if current.totals is not None:
+                continue
+            if current.kind is FILE:
+                self.node_size(current)
+            elif not expanded:
+                stack.append((current, True))
+                stack.extend((child, False) for child in current.children.values() if child.totals is None)
+            else:
+                files = dirs = size = 0
+                for child in current.children.values():
+                    child_files, child_dirs, child_size = child.totals
+                    files += child_files
+                    dirs += child_dirs + (child.kind is DIR)
+                    size += child_size
+                current.totals = (files, dirs, size)
+        return node.totals
+
+    def subtree_totals(self, node: VFSNode) -> Tuple[int, int, int]:
+        files, dirs, size = self.totals(node)
+        return (files, dirs + 1, size) if node.kind is DIR else (files, dirs, size)
+
+    def tree_hash(self, node: Optional[VFSNode] = None) -> str:
+        node = node or self.root
+        stack = [(node, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if current.digest is not None:
+                continue
+            if current.kind is FILE:
+                current.digest = self.blob_key(current.content)
+            elif not expanded:
+                stack.append((current, True))
+                stack.extend((child, False) for child in current.children.values() if child.digest is None)
+            else:
+                digest = hashlib.sha256()
+                for name in sorted(current.children):
+                    child = current.children[name]
+                    digest.update(b'd' if child.kind is DIR else b'f')
+                    digest.update(name.encode('utf-8'))
+                    digest.update(b'\0')
+                    digest.update(child.digest)
+                current.digest = digest.digest()
+        return node.digest.hex()
 
     def get_children(self, node: Optional[VFSNode] = None) -> Optional[List[str]]:
-        node = node or self.current_dir
-        if node.type != 'dir':
+        node = self.live(node or self.current_dir)
+        if node.kind is not DIR:
             return None
-        return sorted(node.children.keys())
+        return list(self.listing(node))
+
+    def listing(self, node: VFSNode) -> List[str]:
+        names = self._listings.get(node)
+        if names is None:
+            names = sorted(node.children)
+            self._listings[node] = names
+            if len(self._listings) > PATH_CACHE_SIZE:
+                self._listings.popitem(last=False)
+        return names
+
+    def name_index(self) -> NameIndex:
+        if self._index is None:
+            index = NameIndex()
+            stack = [self.root]
+            while stack:
+                node = stack.pop()
+                if node.kind is DIR:
+                    for child in node.children.values():
+                        index.add(child)
+                        stack.append(child)
+            self._index = index
+        return self._index
+
+    def find_names(self, pattern: str, base: Optional[VFSNode] = None,
+                   ignore_case: bool = False) -> List[Tuple[List[str], VFSNode]]:
+        base = self.live(base or self.root)
+        found = []
+        for node in self.name_index().match(pattern, ignore_case):
+            parts = []
+            current = node
+            while current is not base and current.parent is not None:
+                parts.append(current.name)
+                current = self.parent_of(current)
+            if current is base:
+                parts.reverse()
+                found.append((parts, node))
+        found.sort(key=lambda item: item[0])
+        return found
 
-    def remove_dir(self, path: str) -> str:
+    def glob(self, pattern: str, base: Optional[VFSNode] = None) -> List[str]:
+        absolute = pattern.startswith('/')
+        matches = [('/' if absolute else '', self.root if absolute else self.live(base or self.root))]
+        parts = [part for part in pattern.split('/') if part]
+        for index, part in enumerate(parts):
+            last = index == len(parts) - 1
+            step = []
+            for path, node in matches:
+                if node.kind is not DIR:
+                    continue
+                prefix = path if not path or path.endswith('/') else path + '/'
+                if part in ('.', '..') or not has_magic(part):
+                    child = self._walk(node, part)
+                    if child is not None:
+                        step.append((prefix + part, child))
+                    continue
+                names = self.listing(node)
+                literal = literal_prefix(part)
+                if literal:
+                    names = names[bisect.bisect_left(names, literal):bisect.bisect_left(names, literal + '\U0010ffff')]
+                regex = re.compile(fnmatch.translate(part))
+                for name in names:
+                    if regex.match(name) and (not name.startswith('.') or part.startswith('.')):
+                        child = node.children[name]
+                        if last or child.kind is DIR:
+                            step.append((prefix + name, child))
+            matches = step
+        return [path for path, _ in matches]
+
+    def remove_dir(self, path: str, base: Optional[VFSNode] = None) -> str:
         if path == "/" or path.strip() == "":
             return "rmdir: cannot remove root directory."
-        parts = [p for p in path.strip('/').split('/') if p]
-        parent_parts = parts[:-1]
-        target_name = parts[-1]
-        parent_node = self.get_node("/" + "/".join(parent_parts)) if parent_parts else self.root
-        if parent_node is None:
-            return f"rmdir: {path}: No such directory"
-        if target_name not in parent_node.children:
+        target_node = self.get_node(path, base)
+        if target_node is None:
             return f"rmdir: {path}: No such directory"
-        target_node = parent_node.children[target_name]
-        if target_node.type != 'dir':
+        if target_node is self.root:
+            return "rmdir: cannot remove root directory."
+        if target_node.kind is not DIR:
             return f"rmdir: {path}: Not a directory"
         if target_node.children:
             return f"rmdir: {path}: Directory not empty"
-        del parent_node.children[target_name]
+        self._detach(target_node)
         return f"rmdir: removed directory '{path}'"
 
-    def move_node(self, src: str, dst: str) -> str:
-        src_node = self.get_node(src)
+    def move_node(self, src: str, dst: str, base: Optional[VFSNode] = None) -> str:
+        src_node = self.get_node(src, base)
         if src_node is None:
             return f"mv: cannot stat '{src}': No such file or directory"
-        src_parts = [p for p in src.strip('/').split('/') if p]
-        src_parent_parts = src_parts[:-1]
-        src_name = src_parts[-1]
-        src_parent = self.get_node("/" + "/".join(src_parent_parts)) if src_parent_parts else self.root
+        if src_node is self.root:
+            return f"mv: cannot move '{src}': root directory"
+        src_name = src_node.name
 
-        dst_node = self.get_node(dst)
-        if dst_node and dst_node.type == 'dir':
+        dst_node = self.get_node(dst, base)
+        if dst_node and dst_node.kind is DIR:
+            dst_parent, dst_name = dst_node, src_name
             if src_name in dst_node.children:
                 return f"mv: cannot move '{src}': target already exists in '{dst}'"
-            dst_node.children[src_name] = src_node
-            del src_parent.children[src_name]
-            return f"mv: moved '{src}' -> '{dst}/'"
+            message = f"mv: moved '{src}' -> '{dst}/'"
         else:
-            dst_parts = [p for p in dst.strip('/').split('/') if p]
-            dst_parent_parts = dst_parts[:-1]
-            dst_name = dst_parts[-1] if dst_parts else src_name
-            dst_parent = self.get_node("/" + "/".join(dst_parent_parts)) if dst_parent_parts else self.root
-            if dst_parent is None:
+            head, _, dst_name = dst.rstrip('/').rpartition('/')
+            dst_name = dst_name or src_name
+            dst_parent = self.get_node(head or ('/' if dst.startswith('/') else '.'), base)
+            if dst_parent is None or dst_parent.kind is not DIR:
                 return f"mv: cannot move '{src}' -> '{dst}': No such directory"
             if dst_name in dst_parent.children:
                 return f"mv: cannot move '{src}' -> '{dst}': Target already exists"
-            dst_parent.children[dst_name] = src_node
-            del src_parent.children[src_name]
-            src_node.name = dst_name
-            return f"mv: renamed/moved '{src}' -> '{dst}'"
-
-    def read_file_content(self, path: str) -> Optional[str]:
-        node = self.get_node(path)
-        if node is None or node.type != 'file':
+            message = f"mv: renamed/moved '{src}' -> '{dst}'"
+
+        ancestor = dst_parent
+        while ancestor is not None:
+            if ancestor is src_node:
+                return f"mv: cannot move '{src}' to a subdirectory of itself"
+            ancestor = self.parent_of(ancestor)
+        self._detach(src_node)
+        self._attach(dst_parent, dst_name, src_node)
+        return message
+
+    def _parent_and_name(self, path: str, base: Optional[VFSNode] = None) -> Tuple[Optional[VFSNode], str]:
+        head, _, name = path.rstrip('/').rpartition('/')
+        parent = self.get_node(head or ('/' if path.startswith('/') else '.'), base)
+        if parent is None or parent.kind is not DIR or name in ('.', '..'):
+            return None, name
+        return parent, name
+
+    def make_dir(self, path: str, base: Optional[VFSNode] = None, parents: bool = False) -> str:
+        if not parents:
+            parent, name = self._parent_and_name(path, base)
+            if parent is None:
+                return f"mkdir: cannot create directory '{path}': No such file or directory"
+            if not name or name in parent.children:
+                return f"mkdir: cannot create directory '{path}': File exists"
+            self._attach(parent, name, VFSNode(name, DIR))
+            return f"mkdir: created directory '{path}'"
+
+        node = self.root if path.startswith('/') else self.live(base or self.root)
+        for part in path.split('/'):
+            if not part or part == '.':
+                continue
+            if part == '..':
+                node = self.parent_of(node) or node
+                continue
+            child = node.children.get(part)
+            if child is None:
+                child = VFSNode(part, DIR)
+                self._attach(node, part, child)
+            elif child.kind is not DIR:
+                return f"mkdir: cannot create directory '{path}': Not a directory"
+            node = child
+        return f"mkdir: created directory '{path}'"
+
+    def touch_file(self, path: str, base: Optional[VFSNode] = None) -> str:
+        if self.get_node(path, base) is not None:
+            return ""
+        parent, name = self._parent_and_name(path, base)
+        if parent is None or not name:
+            return f"touch: cannot touch '{path}': No such file or directory"
+        self._attach(parent, name, VFSNode(name, FILE, self.blobs.intern(b'')))
+        return ""
+
+    def write_file(self, path: str, data: bytes, base: Optional[VFSNode] = None, append: bool = False) -> str:
+        parent, name = self._parent_and_name(path, base)
+        if parent is None or not name:
+            return f"cannot create '{path}': No such file or directory"
+        existing = parent.children.get(name)
+        if existing is not None and existing.kind is DIR:
+            return f"cannot create '{path}': Is a directory"
+        if existing is not None:
+            if append:
+                data = self.read_node_content(existing) + data
+            self._detach(existing)
+            self._release(existing)
+        self._attach(parent, name, VFSNode(name, FILE, self.blobs.intern(data)))
+        return ""
+
+    def remove_path(self, path: str, base: Optional[VFSNode] = None, recursive: bool = False,
+                    force: bool = False) -> str:
+        node = self.get_node(path, base)
+        if node is None:
+            return "" if force else f"rm: cannot remove '{path}': No such file or directory"
+        if node is self.root:
+            return f"rm: cannot remove '{path}': root directory"
+        if node.kind is DIR and not recursive:
+            return f"rm: cannot remove '{path}': Is a directory"
+        self._detach(node)
+        self._drop(node)
+        return f"rm: removed '{path}'"
+
+    def _unindex(self, node: VFSNode):
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self._index.discard(current)
+            if current.kind is DIR:
+                stack.extend(current.children.values())
+
+    def _drop(self, node: VFSNode):
+        # Releases the blobs below a detached node and forgets its descendants in
+        # the name index. Subtrees shared with a snapshot hold no blobs of ours.
+        if self._index is not None:
+            self._unindex(node)
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.kind is FILE:
+                self._release(current)
+            elif current.owner is self._gen:
+                stack.extend(current.children.values())
+
+    def copy_path(self, src: str, dst: str, base: Optional[VFSNode] = None, recursive: bool = False) -> str:
+        src_node = self.get_node(src, base)
+        if src_node is None:
+            return f"cp: cannot stat '{src}': No such file or directory"
+        if src_node.kind is DIR and not recursive:
+            return f"cp: -r not specified; omitting directory '{src}'"
+
+        dst_node = self.get_node(dst, base)
+        if dst_node is not None and dst_node.kind is DIR:
+            dst_parent, dst_name = dst_node, src_node.name
+        elif dst_node is not None:
+            dst_parent, dst_name = self.parent_of(dst_node), dst_node.name
+        else:
+            dst_parent, dst_name = self._parent_and_name(dst, base)
+            if dst_parent is None or not dst_name:
+                return f"cp: cannot create regular file '{dst}': No such file or directory"
+
+        existing = dst_parent.children.get(dst_name)
+        if existing is src_node:
+            return f"cp: '{src}' and '{dst}' are the same file"
+        if src_node.kind is DIR:
+            if existing is not None:
+                return f"cp: cannot copy '{src}' -> '{dst}': Target already exists"
+            ancestor = dst_parent
+            while ancestor is not None:
+                if ancestor is src_node:
+                    return f"cp: cannot copy a directory, '{src}', into itself, '{dst}'"
+                ancestor = self.parent_of(ancestor)
+            self.copy_tree(src_node, dst_parent, dst_name)
+            return f"cp: copied '{src}' -> '{dst}'"
+        if existing is not None and existing.kind is DIR:
+            return f"cp: cannot overwrite directory '{dst}' with non-directory"
+        self.copy_file(src_node, dst_parent, dst_name)
+        return f"cp: copied '{src}' -> '{dst}'"
+
+    def read_file_content(self, path: str, base: Optional[VFSNode] = None) -> Optional[bytes]:
+        node = self.get_node(path, base)
+        if node is None or node.kind is not FILE:
+            return None
+        return self.read_node_content(node)
+
+    def read_node_content(self, node: VFSNode) -> bytes:
+        return self.read_blob(node.content)
+
+    def read_blob(self, blob: Blob) -> bytes:
+        content = blob.data
+        if isinstance(content, bytes):
+            return content
+        if isinstance(content, LazyContent):
+            data = self.content_cache.get(content)
+            if data is None:
+                with phase("decode"):
+                    data = content.read()
+                self.content_cache.put(content, data, len(data))
+            return data
+        with phase("decode"):
+            return base64.b64decode(content)
+
+    def blob_key(self, blob: Blob) -> bytes:
+        if blob.key is not None:
+            return blob.key
+        key = hashlib.sha256(self.read_blob(blob)).digest()
+        self.blobs.set_key(blob, key)
+        return key
+
+    def copy_file(self, node: VFSNode, parent: VFSNode, name: str) -> VFSNode:
+        existing = parent.children.get(name)
+        if existing is not None:
+            self._detach(existing)
+            self._release(existing)
+        copy = VFSNode(name, FILE, self.blobs.acquire(node.content))
+        self._attach(parent, name, copy)
+        return copy
+
+    def copy_tree(self, node: VFSNode, parent: VFSNode, name: str) -> VFSNode:
+        top = VFSNode(name, DIR)
+        self._attach(parent, name, top)
+        stack = [(node, top)]
+        while stack:
+            source, target = stack.pop()
+            for child_name, child in source.children.items():
+                if child.kind is FILE:
+                    copy = VFSNode(child_name, FILE, self.blobs.acquire(child.content))
+                else:
+                    copy = VFSNode(child_name, DIR)
+                    stack.append((child, copy))
+                self._attach(target, child_name, copy)
+        return top
+
+    def _release(self, node: VFSNode):
+        # Nodes still visible from a snapshot or fork keep their blobs referenced.
+        if node.kind is FILE and node.owner is self._gen:
+            self.blobs.release(node.content)
+
+    def content_source(self, node: VFSNode):
+        content = node.content.data
+        if isinstance(content, bytes):
+            return BytesSource(content)
+        if isinstance(content, LazyContent):
+            data = self.content_cache.get(content)
+            if data is not None:
+                return BytesSource(data)
+            if isinstance(content, MappedContent):
+                return MappedSource(content.source, content.offset, content.length)
+            if content.encoded and content.length % 4 == 0:
+                return Base64Source(content.source, content.offset, content.length)
+        elif content and len(content) % 4 == 0:
+            return Base64Source(content, 0, len(content))
+        return BytesSource(self.read_blob(node.content))
+
+    def open_lines(self, path: str, base: Optional[VFSNode] = None) -> Optional[LineReader]:
+        node = self.get_node(path, base)
+        if node is None or node.kind is not FILE:
+            return None
+        return LineReader(self.content_source(node))
+
+    def close(self):
+        self.content_cache.clear()
+        self._sources.users -= 1
+        if not self._sources.users:
+            for source in self._sources:
+                source.close()
+        self._sources = _Sources()
+
+
+class _Sources(list):
+    # The file mappings behind lazy contents, shared by a VFS and its forks.
+    def __init__(self):
+        super().__init__()
+        self.users = 1
+
+
+class _HashedLines:
+    def __init__(self, lines: Iterable[bytes], digest, offset: int = 0):
+        self.lines = lines
+        self.digest = digest
+        self.line = b''
+        self.line_start = offset
+        self._offset = offset
+
+    def __iter__(self) -> Iterator[str]:
+        # The image hash is defined over the text with universal newlines, as it
+        # was when the whole file was read in text mode, so normalise before hashing.
+        # The source splits only on '\n'; a chunk holding bare '\r' line ends is
+        # split again so the reader sees one line at a time, as text mode did.
+        for chunk in self.lines:
+            if self.digest is not None:
+                self.digest.update(chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n'))
+            end = len(chunk) - (2 if chunk.endswith(b'\r\n') else 1)
+            for raw in chunk.splitlines(keepends=True) if chunk.find(b'\r', 0, end) >= 0 else (chunk,):
+                self.line = raw
+                self.line_start = self._offset
+                self._offset += len(raw)
+                yield raw.decode('utf-8')
+
+    def content_extent(self, content: str) -> Optional[Tuple[int, int]]:
+        encoded = content.encode('utf-8')
+        raw = self.line.rstrip(b'\r\n').rstrip()
+        if not encoded or not raw.endswith(encoded):
             return None
-        return node.content
+        return self.line_start + len(raw) - len(encoded), len(encoded)
+
+
+def _ingest(store: BlobStore, content: str) -> Blob:
+    try:
+        return store.intern(base64.b64decode(content))
+    except ValueError:
+        # Undecodable content fails when it is read, as it did before the store.
+        return store.adopt(content, content_size(content))
 
 
-def load_vfs_from_csv(file_path: str) -> Tuple[Optional[VFS], Optional[str]]:
+def _unsized_dir(name: str) -> VFSNode:
+    # Aggregates of a freshly loaded image are filled in by one pass of
+    # VFS.totals() on first use instead of being propagated on every row.
+    node = VFSNode(name, DIR)
+    node.totals = None
+    return node
+
+
+def _place_row(vfs: VFS, parts: List[str], blob: Optional[Blob] = None):
+    # One CSV row: missing or non-directory parents become directories, a dir
+    # row keeps whatever is already there and a file row replaces it.
+    current_node = vfs.root
+    for part in parts[:-1]:
+        child = current_node.children.get(part)
+        if child is None:
+            vfs._insert(current_node, _unsized_dir(part))
+        elif child.kind is not DIR:
+            vfs._replace(current_node, part, _unsized_dir(part))
+        current_node = current_node.children[part]
+    filename = parts[-1] if parts else '/'
+    if blob is None:
+        if filename not in current_node.children:
+            vfs._insert(current_node, _unsized_dir(filename))
+    elif filename in current_node.children:
+        vfs._replace(current_node, filename, VFSNode(filename, FILE, blob))
+    else:
+        vfs._insert(current_node, VFSNode(filename, FILE, blob))
+
+
+def load_vfs_from_csv(file_path: str, lazy: bool = False) -> Tuple[Optional[VFS], Optional[str]]:
     vfs_name = os.path.basename(file_path)
     vfs = VFS(name=vfs_name)
+    vfs.root.totals = None
+    vfs._index = NameIndex()
+    digest = hashlib.sha256()
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            vfs.raw_data_string = content
-            reader = csv.reader(content.splitlines(), delimiter=',')
+        with open(file_path, 'rb') as f:
+            source = None
+            if lazy and os.fstat(f.fileno()).st_size > 0:
+                source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                vfs._sources.append(source)
+                lines = _HashedLines(iter(source.readline, b''), digest)
+            else:
+                lines = _HashedLines(f, digest)
+            csv.field_size_limit(CSV_FIELD_LIMIT)
+            reader = csv.reader(lines, delimiter=',')
             header = next(reader)
             if header != ['Type', 'Path', 'Content']:
                 return None, "Invalid CSV header format"
@@ -119,22 +840,19 @@ def load_vfs_from_csv(file_path: str) -> Tuple[Optional[VFS], Optional[str]]:
                 if not vfs_path.startswith('/'):
                     return None, f"Path '{vfs_path}' must start with '/'"
                 parts = [p for p in vfs_path.split('/') if p]
-                filename = parts[-1] if parts else '/'
-                parent_parts = parts[:-1]
-                current_node = vfs.root
-                for part in parent_parts:
-                    if part not in current_node.children or current_node.children[part].type != 'dir':
-                        new_node = VFSNode(part, 'dir')
-                        current_node.children[part] = new_node
-                    current_node = current_node.children[part]
                 if vfs_type == 'dir':
-                    if filename not in current_node.children:
-                        current_node.children[filename] = VFSNode(filename, 'dir')
+                    _place_row(vfs, parts)
                 elif vfs_type == 'file':
-                    current_node.children[filename] = VFSNode(filename, 'file', vfs_content)
+                    extent = lines.content_extent(vfs_content) if source is not None else None
+                    if extent is not None:
+                        content = LazyContent(source, *extent)
+                        blob = vfs.blobs.adopt(content, content_size(content))
+                    else:
+                        blob = _ingest(vfs.blobs, vfs_content)
+                    _place_row(vfs, parts, blob)
                 else:
                     return None, f"Invalid VFS type: {vfs_type}"
     except Exception as e:
         return None, f"Error loading VFS: {e}"
-    vfs.calculate_hash()
+    vfs.hash_value = digest.hexdigest()
     return vfs, None
\ No newline at end of file